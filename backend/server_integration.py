@@ -6,18 +6,68 @@ Ce fichier montre comment intégrer les 4 corrections dans l'application AIM exi
 # IMPORTS SUPPLÉMENTAIRES À AJOUTER AU server.py ORIGINAL
 from services.conversation_manager import ConversationManager  
 from services.ai_prompt_system import AIPromptSystem
-from services.task_extractor import TaskExtractor
+from services.task_extractor import TaskExtractor, parse_deadline
 from services.memory_system import MemorySystem
+from services.response_cache import SemanticResponseCache
+from services.request_context import RequestCtx
+from fastapi import BackgroundTasks
+from fastapi.responses import StreamingResponse
+from openai import AsyncOpenAI
+import asyncio
+import json
+
+# CONNEXION MONGODB (remplace la création du client dans server.py)
+"""
+# Pool de connexions dimensionné pour les requêtes parallèles (asyncio.gather) du chat
+# et les tâches de fond ; connexions inactives recyclées après 5 minutes
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=200,
+    minPoolSize=10,
+    maxIdleTimeMS=300000,
+    waitQueueTimeoutMS=2000,
+    retryWrites=True,
+    # Compression réseau : zstd/snappy si installés (zstandard, python-snappy), sinon zlib
+    compressors='zstd,snappy,zlib'
+)
+db = client[os.environ['DB_NAME']]
+
+# Boucle d'événements uvloop : lancer avec `uvicorn server:app --loop uvloop`
+# ou, si le serveur est démarré depuis le code, avant uvicorn.run(...) :
+import uvloop
+uvloop.install()
+"""
 
 # INITIALISATION DES SERVICES (à ajouter après la connexion DB)
 """
 # Ajouter après la ligne : db = client[os.environ['DB_NAME']]
 
 # 🔧 INITIALISATION DES SERVICES DE CORRECTION CRITIQUES
+# Client OpenAI asynchrone : l'appel LLM ne bloque plus la boucle d'événements
+async_openai_client = AsyncOpenAI(api_key=os.environ['OPENAI_API_KEY'])
+
 conversation_manager = ConversationManager(db)
 ai_prompt_system = AIPromptSystem(db) 
-task_extractor = TaskExtractor(db, openai_client)
-memory_system = MemorySystem(db, openai_client, embedding_model)
+memory_system = MemorySystem(
+    db, async_openai_client, embedding_model,
+    use_vector_index=os.environ.get('MEMORY_USE_VEC_INDEX', 'true').lower() == 'true',
+    # Nom de l'index Atlas Vector Search sur conversation_memory.embedding (ex: 'mem_vec')
+    vector_search_index=os.environ.get('MEMORY_VECTOR_SEARCH_INDEX') or None
+)
+# Réutilise le batcher d'embeddings de la mémoire pour le cache sémantique des extractions
+task_extractor = TaskExtractor(
+    db, async_openai_client, embedding_batcher=memory_system.embedding_batcher,
+    ai_model=os.environ.get('TASK_EXTRACTION_MODEL', 'gpt-3.5-turbo'),
+    # Schéma JSON strict : nécessite un modèle compatible (ex: gpt-4o-mini)
+    strict_schema=os.environ.get('TASK_EXTRACTION_STRICT_SCHEMA', 'false').lower() == 'true'
+)
+
+# Cache sémantique des réponses IA (désactivé par défaut)
+response_cache = (
+    SemanticResponseCache()
+    if os.environ.get('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+    else None
+)
 
 print("✅ Services de correction critiques initialisés")
 """
@@ -26,6 +76,7 @@ print("✅ Services de correction critiques initialisés")
 
 @api_router.post("/chat/send")
 async def send_chat_message_improved(
+    background_tasks: BackgroundTasks,
     message: str = Form(...),
     conversation_id: Optional[str] = Form(None),
     user_id: str = Depends(get_current_user_id)
@@ -34,116 +85,44 @@ async def send_chat_message_improved(
     🗣️ CORRECTION #1 : Endpoint de chat amélioré avec gestion des conversations
     """
     try:
-        # 1. GESTION DES CONVERSATIONS AMÉLIORÉE
-        if not conversation_id:
-            # Créer une nouvelle conversation
-            conversation = await conversation_manager.create_conversation(
-                user_id=user_id,
-                title=message[:50] + "..." if len(message) > 50 else message
-            )
-            conversation_id = conversation['id']
-        else:
-            # Vérifier que la conversation existe et appartient à l'utilisateur
-            conversation = await conversation_manager.get_conversation_by_id(
-                conversation_id, user_id
-            )
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-
-        # 2. SYSTÈME DE MÉMOIRE CONVERSATIONNELLE AMÉLIORÉ
-        # Récupérer le contexte conversationnel récent
-        conversation_context = await memory_system.retrieve_relevant_memories(
-            user_id=user_id,
-            query=message,
-            limit=5
+        # 1-2. CONVERSATION, MÉMOIRE ET CONTEXTE UTILISATEUR
+        conversation_id, conversation_context, user_context, current_goals, ctx = await _prepare_chat_turn(
+            message, conversation_id, user_id
         )
 
-        # 3. SYSTÈME DE PROMPTS IA AMÉLIORÉ
-        # Générer un prompt enrichi avec contexte
-        enhanced_prompt = await ai_prompt_system.get_enhanced_prompt(
-            prompt_type='coaching_base',
-            user_id=user_id,
-            conversation_history=str(conversation_context),
-            user_message=message
-        )
+        # 3. CACHE SÉMANTIQUE : réutiliser une réponse récente à une question équivalente
+        query_embedding, cached_response = await _lookup_cached_response(user_id, message)
 
-        # 4. GÉNÉRATION RÉPONSE IA avec prompt amélioré
-        try:
-            ai_response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": enhanced_prompt},
-                    {"role": "user", "content": message}
-                ],
-                temperature=0.7,
-                max_tokens=500
+        ai_response_ok = False
+        if cached_response is not None:
+            response_text = cached_response
+        else:
+            # 4. SYSTÈME DE PROMPTS IA AMÉLIORÉ
+            # Persona statique en tête, contexte dynamique en fin (préfixe stable pour le cache de prompts)
+            coaching_messages = await ai_prompt_system.get_coaching_messages(
+                user_id=user_id,
+                user_message=message,
+                conversation_history=ai_prompt_system.format_conversation_history(conversation_context),
+                user_context=user_context,
+                current_goals=current_goals
             )
-            response_text = ai_response.choices[0].message.content
-        except Exception as ai_error:
-            logger.error(f"Erreur OpenAI: {ai_error}")
-            response_text = "Je rencontre actuellement des difficultés techniques. Pouvez-vous reformuler votre question ?"
 
-        # 5. EXTRACTION DE TÂCHES AUTOMATIQUE
-        task_extraction = await task_extractor.extract_tasks_from_message(
-            message=message,
-            user_id=user_id,
-            conversation_id=conversation_id,
-            conversation_context=[{'content': msg.get('user_message', ''), 'is_user': True} for msg in conversation_context]
-        )
-
-        # Créer les tâches extraites automatiquement
-        created_tasks = []
-        if task_extraction['tasks_found'] and task_extraction['confidence_score'] > 0.6:
-            for task_data in task_extraction['tasks_found']:
-                # Trouver un goal associé ou créer un goal par défaut
-                related_goal_id = task_data.get('related_goal_id')
-                if not related_goal_id:
-                    # Créer un goal par défaut si aucun n'existe
-                    default_goals = await db.goals.find({'user_id': user_id, 'status': 'active'}).limit(1).to_list(1)
-                    if default_goals:
-                        related_goal_id = default_goals[0]['id']
-                    else:
-                        # Créer un goal par défaut
-                        default_goal = Goal(
-                            user_id=user_id,
-                            title="Objectifs généraux",
-                            description="Objectifs et tâches extraits automatiquement des conversations"
-                        )
-                        await db.goals.insert_one(default_goal.dict())
-                        related_goal_id = default_goal.id
-
-                # Créer la tâche
-                new_task = TodoItem(
-                    user_id=user_id,
-                    goal_id=related_goal_id,
-                    title=task_data['title'],
-                    description=task_data['description'],
-                    priority=task_data.get('priority', 'medium'),
-                    source='ai_chat',
-                    conversation_id=conversation_id,
-                    deadline=datetime.strptime(task_data['estimated_date'], '%Y-%m-%d') if task_data.get('estimated_date') else None
+            # GÉNÉRATION RÉPONSE IA avec prompt amélioré
+            try:
+                ai_response = await async_openai_client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=coaching_messages,
+                    temperature=0.7,
+                    max_tokens=500,
+                    extra_body={"prompt_cache_key": user_id}
                 )
-                
-                await db.todos.insert_one(new_task.dict())
-                created_tasks.append({
-                    'id': new_task.id,
-                    'title': new_task.title,
-                    'priority': new_task.priority
-                })
-
-        # 6. STOCKAGE EN MÉMOIRE CONVERSATIONNELLE
-        await memory_system.store_conversation_memory(
-            user_id=user_id,
-            conversation_id=conversation_id,
-            message=message,
-            response=response_text,
-            message_type='user'
-        )
+                response_text = ai_response.choices[0].message.content
+                ai_response_ok = True
+            except Exception as ai_error:
+                logger.error(f"Erreur OpenAI: {ai_error}")
+                response_text = AI_FALLBACK_RESPONSE
 
-        # 7. MISE À JOUR DES COMPTEURS DE CONVERSATION
-        await conversation_manager.increment_message_count(conversation_id, user_id)
-
-        # 8. SAUVEGARDER LE MESSAGE EN BASE
+        # 5. SAUVEGARDER LE MESSAGE EN BASE (source de vérité, reste sur le chemin critique)
         chat_message = ChatMessage(
             conversation_id=conversation_id,
             user_id=user_id,
@@ -153,13 +132,29 @@ async def send_chat_message_improved(
         )
         await db.messages.insert_one(chat_message.dict())
 
+        # 6-8. EXTRACTION DE TÂCHES, MÉMOIRE ET COMPTEURS EN TÂCHE DE FOND
+        # Les tâches créées sont rattachées au message (champ tasks_extracted)
+        background_tasks.add_task(
+            _finalize_chat_turn,
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message=message,
+            response_text=response_text,
+            conversation_context=conversation_context,
+            query_embedding=query_embedding,
+            cacheable=ai_response_ok,
+            chat_message_id=chat_message.id,
+            ctx=ctx
+        )
+
         return {
             "success": True,
             "message": message,
             "response": response_text,
             "conversation_id": conversation_id,
-            "tasks_extracted": created_tasks,
-            "extraction_confidence": task_extraction.get('confidence_score', 0),
+            "message_id": chat_message.id,
+            "tasks_extracted": [],
+            "tasks_extraction_pending": True,
             "timestamp": datetime.utcnow()
         }
 
@@ -170,6 +165,275 @@ async def send_chat_message_improved(
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
 
 
+@api_router.post("/chat/stream")
+async def stream_chat_message(
+    message: str = Form(...),
+    conversation_id: Optional[str] = Form(None),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    🗣️ CORRECTION #1 : Chat en streaming (Server-Sent Events)
+    La réponse est envoyée token par token ; extraction de tâches et mémoire sont traitées après le flux
+    """
+    try:
+        conversation_id, conversation_context, user_context, current_goals, ctx = await _prepare_chat_turn(
+            message, conversation_id, user_id
+        )
+        query_embedding, cached_response = await _lookup_cached_response(user_id, message)
+
+        coaching_messages = None
+        if cached_response is None:
+            coaching_messages = await ai_prompt_system.get_coaching_messages(
+                user_id=user_id,
+                user_message=message,
+                conversation_history=ai_prompt_system.format_conversation_history(conversation_context),
+                user_context=user_context,
+                current_goals=current_goals
+            )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur préparation chat streaming: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+    async def stream_gen():
+        chunks = []
+        ai_response_ok = False
+
+        try:
+            if cached_response is not None:
+                chunks.append(cached_response)
+                yield f"data: {json.dumps({'delta': cached_response})}\n\n"
+            else:
+                try:
+                    stream = await async_openai_client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=coaching_messages,
+                        temperature=0.7,
+                        max_tokens=500,
+                        stream=True,
+                        extra_body={"prompt_cache_key": user_id}
+                    )
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            chunks.append(delta)
+                            yield f"data: {json.dumps({'delta': delta})}\n\n"
+                    ai_response_ok = True
+                except Exception as ai_error:
+                    logger.error(f"Erreur OpenAI streaming: {ai_error}")
+                    if not chunks:
+                        chunks.append(AI_FALLBACK_RESPONSE)
+                        yield f"data: {json.dumps({'delta': AI_FALLBACK_RESPONSE})}\n\n"
+
+            yield f"data: {json.dumps({'done': True, 'conversation_id': conversation_id})}\n\n"
+
+        finally:
+            # Post-traitement hors du flux, même si le client se déconnecte en cours de route
+            # (message déjà compté) : sauvegarde du message d'abord, puis tâches et mémoire
+            _schedule_background(_finalize_chat_turn(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                message=message,
+                response_text="".join(chunks),
+                conversation_context=conversation_context,
+                query_embedding=query_embedding,
+                cacheable=ai_response_ok,
+                ctx=ctx
+            ))
+
+    return StreamingResponse(stream_gen(), media_type="text/event-stream")
+
+
+# FONCTIONS INTERNES DU CHAT
+AI_FALLBACK_RESPONSE = "Je rencontre actuellement des difficultés techniques. Pouvez-vous reformuler votre question ?"
+
+# Tâches de fond en cours (référence forte pour éviter leur collecte par le GC)
+_background_tasks = set()
+
+
+def _schedule_background(coro):
+    """Lance une coroutine en tâche de fond en gardant une référence"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
+
+
+def _on_background_done(task):
+    """Libère la référence d'une tâche de fond et journalise son éventuelle erreur"""
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Erreur tâche de fond chat: {task.exception()}")
+
+
+async def _prepare_chat_turn(message: str, conversation_id: Optional[str], user_id: str):
+    """Résout la conversation puis récupère mémoire et contexte utilisateur"""
+    # 1. GESTION DES CONVERSATIONS AMÉLIORÉE
+    if not conversation_id:
+        # Créer une nouvelle conversation
+        conversation = await conversation_manager.create_conversation(
+            user_id=user_id,
+            title=message[:50] + "..." if len(message) > 50 else message,
+            first_message=True
+        )
+        conversation_id = conversation['id']
+    else:
+        # Vérifier que la conversation appartient à l'utilisateur et compter le message en un aller-retour
+        conversation = await conversation_manager.record_message(conversation_id, user_id)
+        if not conversation:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # 2. SYSTÈME DE MÉMOIRE CONVERSATIONNELLE AMÉLIORÉ
+    # Récupérer en parallèle le contexte conversationnel récent et les documents utilisateur du tour
+    conversation_context, ctx = await asyncio.gather(
+        memory_system.retrieve_relevant_memories(
+            user_id=user_id,
+            query=message,
+            limit=5
+        ),
+        RequestCtx.load(db, user_id)
+    )
+    user_context, current_goals = await ai_prompt_system.get_prompt_context(user_id, ctx=ctx)
+
+    return conversation_id, conversation_context, user_context, current_goals, ctx
+
+
+async def _lookup_cached_response(user_id: str, message: str):
+    """Cherche une réponse équivalente dans le cache sémantique (si activé)"""
+    if not response_cache:
+        return None, None
+
+    # Même texte que la recherche mémoire : embedding servi par le cache du batcher
+    query_embedding = await memory_system.embedding_batcher.encode(message)
+    return query_embedding, response_cache.lookup(user_id, query_embedding)
+
+
+async def _finalize_chat_turn(user_id: str,
+                              conversation_id: str,
+                              message: str,
+                              response_text: str,
+                              conversation_context: List[Dict[str, Any]],
+                              query_embedding=None,
+                              cacheable: bool = False,
+                              chat_message_id: Optional[str] = None,
+                              ctx: Optional[RequestCtx] = None) -> Dict[str, Any]:
+    """Sauvegarde, extraction de tâches, mise en cache et mémoire d'un échange
+
+    Si chat_message_id est fourni, le message est déjà en base. Sinon il est sauvegardé en premier :
+    une erreur d'extraction ou de création de tâches ne doit pas faire perdre le message.
+    Les tâches créées sont ensuite rattachées au message.
+    """
+    # SAUVEGARDER LE MESSAGE EN BASE (source de vérité)
+    if not chat_message_id:
+        chat_message = ChatMessage(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            message=message,
+            response=response_text,
+            web_search_used=False  # Pour compatibilité
+        )
+        await db.messages.insert_one(chat_message.dict())
+        chat_message_id = chat_message.id
+
+    # 5. EXTRACTION DE TÂCHES AUTOMATIQUE
+    task_extraction = await task_extractor.extract_tasks_from_message(
+        message=message,
+        user_id=user_id,
+        conversation_id=conversation_id,
+        conversation_context=[{'content': msg.get('user_message', ''), 'is_user': True} for msg in conversation_context],
+        ctx=ctx
+    )
+
+    # Mettre en cache la réponse (pas quand des tâches dépendent de la formulation exacte)
+    if response_cache and cacheable and not task_extraction['tasks_found']:
+        response_cache.store(user_id, query_embedding, response_text)
+
+    # Créer les tâches extraites automatiquement (une erreur ici n'empêche pas la mémoire)
+    created_tasks = []
+    try:
+        created_tasks = await _create_extracted_tasks(user_id, conversation_id, task_extraction)
+    except Exception as e:
+        logger.error(f"Erreur création tâches extraites: {e}")
+
+    # 6-8. ÉCRITURES INDÉPENDANTES EN PARALLÈLE
+    # (compteur de messages déjà mis à jour par _prepare_chat_turn)
+    # Mémoire conversationnelle et tâches rattachées au message
+    writes = [
+        memory_system.store_conversation_memory(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            message=message,
+            response=response_text,
+            message_type='user'
+        )
+    ]
+    if created_tasks:
+        writes.append(db.messages.update_one(
+            {'id': chat_message_id},
+            {'$set': {'tasks_extracted': created_tasks}}
+        ))
+    await asyncio.gather(*writes)
+
+    return {
+        'created_tasks': created_tasks,
+        'extraction_confidence': task_extraction.get('confidence_score', 0)
+    }
+
+
+async def _create_extracted_tasks(user_id: str,
+                                  conversation_id: str,
+                                  task_extraction: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Crée les tâches extraites assez sûres et retourne leur résumé (id, titre, priorité)"""
+    created_tasks = []
+    if task_extraction['tasks_found'] and task_extraction['confidence_score'] > 0.6:
+        # Résoudre une seule fois le goal par défaut pour les tâches sans objectif associé
+        default_goal_id = None
+        if any(not task_data.get('related_goal_id') for task_data in task_extraction['tasks_found']):
+            default_goal_doc = await db.goals.find_one({'user_id': user_id, 'status': 'active'}, projection={'id': 1})
+            if default_goal_doc:
+                default_goal_id = default_goal_doc['id']
+            else:
+                # Créer un goal par défaut
+                default_goal = Goal(
+                    user_id=user_id,
+                    title="Objectifs généraux",
+                    description="Objectifs et tâches extraits automatiquement des conversations"
+                )
+                await db.goals.insert_one(default_goal.dict())
+                default_goal_id = default_goal.id
+                # Les objectifs en cache ne reflètent plus la base
+                ai_prompt_system.invalidate(user_id)
+
+        # Créer les tâches en un seul insert
+        new_tasks = [
+            TodoItem(
+                user_id=user_id,
+                goal_id=task_data.get('related_goal_id') or default_goal_id,
+                title=task_data['title'],
+                description=task_data['description'],
+                priority=task_data.get('priority', 'medium'),
+                source='ai_chat',
+                conversation_id=conversation_id,
+                deadline=parse_deadline(task_data.get('estimated_date'))
+            )
+            for task_data in task_extraction['tasks_found']
+        ]
+        await db.todos.insert_many([new_task.dict() for new_task in new_tasks], ordered=False)
+
+        created_tasks = [
+            {
+                'id': new_task.id,
+                'title': new_task.title,
+                'priority': new_task.priority
+            }
+            for new_task in new_tasks
+        ]
+
+    return created_tasks
+
+
 @api_router.get("/conversations")
 async def get_user_conversations_improved(
     limit: int = Query(20, ge=1, le=50),
@@ -179,7 +443,8 @@ async def get_user_conversations_improved(
     🗣️ CORRECTION #1 : Récupération des conversations avec pagination et métadonnées
     """
     try:
-        conversations = await conversation_manager.get_user_conversations(
+        # Conversations et dernier message récupérés en une seule agrégation
+        conversations = await conversation_manager.get_user_conversations_with_last_message(
             user_id=user_id,
             limit=limit
         )
@@ -187,11 +452,7 @@ async def get_user_conversations_improved(
         # Enrichir avec des métadonnées
         enriched_conversations = []
         for conv in conversations:
-            # Récupérer le dernier message
-            last_message = await db.messages.find_one(
-                {'conversation_id': conv['id']},
-                sort=[('timestamp', -1)]
-            )
+            last_message = conv.pop('last_message', None)
 
             conv_data = {
                 **conv,
@@ -319,7 +580,9 @@ async def initialize_corrections_startup():
         # Vérifier que les collections existent
         collections_needed = [
             'conversations', 'conversation_memory', 'task_extractions_log',
-            'prompt_usage_logs', 'system_prompts', 'user_behavior_profiles'
+            'prompt_usage_logs', 'prompt_usage_daily', 'system_prompts',
+            'user_behavior_profiles', 'conversation_summaries', 'task_extraction_cache',
+            'task_extractions_daily', 'memory_synthesis_state'
         ]
         
         existing_collections = await db.list_collection_names()
@@ -330,11 +593,43 @@ async def initialize_corrections_startup():
                 logger.info(f"✅ Collection créée: {collection}")
         
         # Créer des index pour les performances
-        await db.conversation_memory.create_index([("user_id", 1), ("timestamp", -1)])
-        await db.conversations.create_index([("user_id", 1), ("updated_at", -1)])
-        await db.task_extractions_log.create_index([("user_id", 1), ("timestamp", -1)])
+        await conversation_manager.ensure_indexes()
+        await memory_system.ensure_indexes()
+        # Synthèse des profils depuis la mémoire, hors du chemin d'écriture
+        memory_system.start_synthesis_sweeper()
+        await task_extractor.ensure_indexes()
+        # Embeddings des objectifs existants (association tâche -> objectif)
+        _schedule_background(task_extractor.backfill_goal_embeddings())
+        # Dernier message par conversation et historique par utilisateur
+        await db.messages.create_index([("conversation_id", 1), ("timestamp", -1)], background=True)
+        await db.messages.create_index([("user_id", 1), ("timestamp", -1)], background=True)
+        # Objectifs actifs (contexte de prompt, goal par défaut) et tâches par objectif
+        await db.goals.create_index([("user_id", 1), ("status", 1)], background=True)
+        await db.todos.create_index([("user_id", 1), ("goal_id", 1)], background=True)
+        # Agrégat journalier des analytics de prompts
+        await db.prompt_usage_daily.create_index([("date", 1), ("prompt_type", 1), ("user_id", 1)], unique=True, background=True)
+        # Dernier résumé connu d'une conversation
+        await db.conversation_summaries.create_index([("user_id", 1), ("conversation_id", 1), ("last_timestamp", -1)], background=True)
         
         logger.info("🚀 Corrections critiques initialisées avec succès")
         
     except Exception as e:
-        logger.error(f"❌ Erreur initialisation corrections: {e}")
\ No newline at end of file
+        logger.error(f"❌ Erreur initialisation corrections: {e}")
+
+
+# ARRÊT PROPRE (à ajouter au shutdown)
+async def shutdown_corrections():
+    """Vide les buffers des corrections avant l'arrêt"""
+    try:
+        # Laisser se terminer les post-traitements de chat en cours
+        if _background_tasks:
+            await asyncio.gather(*_background_tasks, return_exceptions=True)
+        await memory_system.stop_synthesis_sweeper()
+        await ai_prompt_system.flush_usage_logs()
+        await task_extractor.flush_extraction_logs()
+        await memory_system.flush_memories()
+        await memory_system.embedding_batcher.close()
+        logger.info("✅ Buffers des corrections vidés")
+        
+    except Exception as e:
+        logger.error(f"❌ Erreur arrêt corrections: {e}")
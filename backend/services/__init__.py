@@ -5,16 +5,31 @@ Services AIM - Modules de correction des systèmes critiques
 🤖 AIPromptSystem - Système de prompts IA amélioré  
 ✅ TaskExtractor - Extraction intelligente de tâches
 🧠 MemorySystem - Mémoire conversationnelle avancée
+💾 SemanticResponseCache - Cache sémantique des réponses IA
+📦 EmbeddingBatcher - Calcul des embeddings par lots
+🔎 MemoryVectorIndex - Index vectoriel des souvenirs
+🧾 RequestCtx - Contexte utilisateur partagé d'une requête
+🔤 KeywordMatcher - Détection de mots-clés en un seul passage
 """
 
 from .conversation_manager import ConversationManager
 from .ai_prompt_system import AIPromptSystem
 from .task_extractor import TaskExtractor
 from .memory_system import MemorySystem
+from .response_cache import SemanticResponseCache
+from .embedding_batcher import EmbeddingBatcher
+from .memory_index import MemoryVectorIndex
+from .request_context import RequestCtx
+from .keyword_matcher import KeywordMatcher
 
 __all__ = [
     'ConversationManager',
     'AIPromptSystem', 
     'TaskExtractor',
-    'MemorySystem'
+    'MemorySystem',
+    'SemanticResponseCache',
+    'EmbeddingBatcher',
+    'MemoryVectorIndex',
+    'RequestCtx',
+    'KeywordMatcher'
 ]
\ No newline at end of file
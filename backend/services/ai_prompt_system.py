@@ -2,25 +2,45 @@
 🤖 Système de prompts IA amélioré - CORRECTION CRITIQUE #2
 Corrige la génération et la gestion des prompts pour une meilleure cohérence IA
 """
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple, Mapping
+from collections import OrderedDict, Counter, defaultdict
+from datetime import datetime, timedelta
+from string import Template
+from types import MappingProxyType
+import asyncio
 import logging
-import json
+import re
+import time
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne, ReturnDocument
+from .request_context import RequestCtx
 
 logger = logging.getLogger(__name__)
 
-class AIPromptSystem:
-    """Système de prompts IA avec gestion des contextes et personnalisation"""
-    
-    def __init__(self, db: AsyncIOMotorDatabase):
-        self.db = db
-        self.base_prompts = self._load_base_prompts()
-        
-    def _load_base_prompts(self) -> Dict[str, str]:
-        """Charge les prompts de base du système"""
-        return {
-            'coaching_base': """Tu es AIM, un coach IA personnel spécialisé dans l'accompagnement vers l'atteinte d'objectifs.
+# Placeholders des prompts : {nom} (les accolades JSON des exemples restent littérales)
+_PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+def _compile_prompt(prompt: str) -> Tuple[Template, frozenset]:
+    """Précompile un prompt en Template et relève ses variables"""
+    template = Template(_PLACEHOLDER_PATTERN.sub(r'${\1}', prompt.replace('$', '$$')))
+    return template, frozenset(_PLACEHOLDER_PATTERN.findall(prompt))
+
+# Bornes de taille du contexte injecté dans les prompts (coût et préfixe de prompt stables)
+MAX_CONTEXT_CHARS = 1500
+MAX_FIELD_CHARS = 200
+MAX_GOAL_TITLE_CHARS = 80
+_TRUNCATION_MARK = "[...]"
+
+def _truncate(text: Any, max_chars: int) -> str:
+    """Tronque un texte à max_chars caractères (marqueur [...] inclus)"""
+    text = str(text or '')
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - len(_TRUNCATION_MARK)].rstrip() + _TRUNCATION_MARK
+
+# Prompts de base du système (partagés, en lecture seule)
+_BASE_PROMPTS: Mapping[str, str] = MappingProxyType({
+    'coaching_base': """Tu es AIM, un coach IA personnel spécialisé dans l'accompagnement vers l'atteinte d'objectifs.
 
 Tes caractéristiques :
 - Bienveillant mais ferme quand nécessaire
@@ -28,14 +48,8 @@ Tes caractéristiques :
 - Capable d'adapter ton style selon la personnalité de l'utilisateur
 - Expert en planification progressive et motivation
 
-Contexte utilisateur disponible :
-{user_context}
-
-Historique conversationnel récent :
-{conversation_history}
-
-Objectifs actuels de l'utilisateur :
-{current_goals}
+Le contexte utilisateur, l'historique conversationnel récent et les objectifs actuels
+te sont fournis dans le message système suivant.
 
 Réponds toujours de manière :
 1. Personnalisée selon le profil utilisateur
@@ -43,7 +57,16 @@ Réponds toujours de manière :
 3. Motivante mais réaliste
 4. Intégrant le contexte de la conversation""",
 
-            'task_extraction': """Analyse le message utilisateur suivant et identifie toutes les tâches, actions ou objectifs mentionnés.
+    'coaching_context': """Contexte utilisateur disponible :
+{user_context}
+
+Historique conversationnel récent :
+{conversation_history}
+
+Objectifs actuels de l'utilisateur :
+{current_goals}""",
+
+    'task_extraction': """Analyse le message utilisateur suivant et identifie toutes les tâches, actions ou objectifs mentionnés.
 
 Message utilisateur : "{user_message}"
 
@@ -71,7 +94,7 @@ Retourne ta réponse au format JSON :
     "needs_clarification": false
 }""",
 
-            'memory_synthesis': """Synthétise les éléments importants de cette conversation pour enrichir la mémoire utilisateur.
+    'memory_synthesis': """Synthétise les éléments importants de cette conversation pour enrichir la mémoire utilisateur.
 
 Conversation récente :
 {recent_messages}
@@ -94,7 +117,7 @@ Retourne au format JSON :
     "memory_update_confidence": 0.90
 }""",
 
-            'proactive_coaching': """Génère un message de coaching proactif personnalisé.
+    'proactive_coaching': """Génère un message de coaching proactif personnalisé.
 
 Profil utilisateur :
 {user_profile}
@@ -114,27 +137,60 @@ Généré un message de coaching qui :
 4. Maintient la motivation sans être intrusif
 
 Le message doit être naturel, empathique et actionnable."""
-        }
+})
+
+_COMPILED_BASE_PROMPTS: Mapping[str, Tuple[Template, frozenset]] = MappingProxyType(
+    {k: _compile_prompt(v) for k, v in _BASE_PROMPTS.items()}
+)
+
+class AIPromptSystem:
+    """Système de prompts IA avec gestion des contextes et personnalisation"""
     
-    async def get_enhanced_prompt(self, prompt_type: str, user_id: str, **context) -> str:
+    def __init__(self, db: AsyncIOMotorDatabase, cache_ttl_seconds: int = 300, cache_max_entries: int = 10000):
+        self.db = db
+        # Surcharges admin des prompts de base (les prompts par défaut restent partagés)
+        self._overrides: Dict[str, str] = {}
+        self._compiled_overrides: Dict[str, Tuple[Template, frozenset]] = {}
+        # Cache LRU en mémoire du contexte et des objectifs utilisateur : (type, user_id) -> (valeur, expiration)
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_entries = cache_max_entries
+        self._user_cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        # Logs d'utilisation bufferisés, écrits par lots hors du chemin critique
+        self._usage_buffer: List[Dict[str, Any]] = []
+        self._usage_lock = asyncio.Lock()
+        self._last_usage_flush = time.monotonic()
+        self._bg_tasks: set = set()
+    
+    @property
+    def base_prompts(self) -> Dict[str, str]:
+        """Prompts de base effectifs (défauts + surcharges admin)"""
+        return {**_BASE_PROMPTS, **self._overrides}
+    
+    def get_base_prompt(self, prompt_type: str) -> Optional[str]:
+        """Retourne le prompt de base effectif d'un type"""
+        return self._overrides.get(prompt_type) or _BASE_PROMPTS.get(prompt_type)
+    
+    def _get_compiled_prompt(self, prompt_type: str) -> Optional[Tuple[Template, frozenset]]:
+        """Retourne le prompt précompilé effectif d'un type"""
+        return self._compiled_overrides.get(prompt_type) or _COMPILED_BASE_PROMPTS.get(prompt_type)
+        
+    async def get_enhanced_prompt(self, prompt_type: str, user_id: str, ctx: Optional[RequestCtx] = None, **context) -> str:
         """Génère un prompt enrichi avec le contexte utilisateur"""
         try:
-            base_prompt = self.base_prompts.get(prompt_type)
-            if not base_prompt:
+            compiled = self._get_compiled_prompt(prompt_type)
+            if not compiled:
                 logger.error(f"Type de prompt inconnu: {prompt_type}")
                 return ""
+            template, placeholders = compiled
             
-            # Enrichir avec le contexte utilisateur
-            user_context = await self._get_user_context(user_id)
-            conversation_history = context.get('conversation_history', '')
-            current_goals = await self._get_user_goals(user_id)
+            # Enrichir avec le contexte utilisateur seulement si le prompt l'utilise
+            # (sauf s'il a déjà été récupéré par l'appelant)
+            if placeholders & {'user_context', 'current_goals'}:
+                if context.get('user_context') is None or context.get('current_goals') is None:
+                    context['user_context'], context['current_goals'] = await self.get_prompt_context(user_id, ctx=ctx)
             
-            enhanced_prompt = base_prompt.format(
-                user_context=user_context,
-                conversation_history=conversation_history,
-                current_goals=current_goals,
-                **context
-            )
+            # Variables manquantes remplacées par une chaîne vide
+            enhanced_prompt = template.substitute(defaultdict(str, {k: v for k, v in context.items() if v is not None}))
             
             # Sauvegarder pour analytics
             await self._log_prompt_usage(prompt_type, user_id)
@@ -143,32 +199,116 @@ Le message doit être naturel, empathique et actionnable."""
             
         except Exception as e:
             logger.error(f"Erreur génération prompt {prompt_type}: {e}")
-            return self.base_prompts.get(prompt_type, "")
+            return self.get_base_prompt(prompt_type) or ""
+    
+    async def get_coaching_messages(self,
+                                    user_id: str,
+                                    user_message: str,
+                                    conversation_history: str = '',
+                                    user_context: Optional[str] = None,
+                                    current_goals: Optional[str] = None) -> List[Dict[str, str]]:
+        """Construit les messages de coaching : persona statique en tête, contexte dynamique en fin"""
+        # Le préfixe statique reste identique d'un tour à l'autre pour profiter du cache de prompts
+        context_prompt = await self.get_enhanced_prompt(
+            prompt_type='coaching_context',
+            user_id=user_id,
+            conversation_history=conversation_history,
+            user_context=user_context,
+            current_goals=current_goals
+        )
+        
+        return [
+            {"role": "system", "content": self.get_base_prompt('coaching_base') or ''},
+            {"role": "system", "content": context_prompt},
+            {"role": "user", "content": user_message}
+        ]
+    
+    async def get_prompt_context(self, user_id: str, ctx: Optional[RequestCtx] = None) -> Tuple[str, str]:
+        """Récupère en parallèle le contexte utilisateur et ses objectifs actuels"""
+        user_context, current_goals = await asyncio.gather(
+            self._get_user_context(user_id, ctx=ctx),
+            self._get_user_goals(user_id)
+        )
+        return user_context, current_goals
+    
+    def invalidate(self, user_id: str):
+        """Invalide le contexte et les objectifs en cache d'un utilisateur"""
+        self._user_cache.pop(('user_context', user_id), None)
+        self._user_cache.pop(('user_goals', user_id), None)
     
-    async def _get_user_context(self, user_id: str) -> str:
+    def _get_cached(self, kind: str, user_id: str) -> Optional[str]:
+        """Lit une valeur du cache utilisateur si elle n'a pas expiré"""
+        entry = self._user_cache.get((kind, user_id))
+        if entry is None:
+            return None
+        
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._user_cache[(kind, user_id)]
+            return None
+        
+        self._user_cache.move_to_end((kind, user_id))
+        return value
+    
+    def _set_cached(self, kind: str, user_id: str, value: str):
+        """Écrit une valeur dans le cache utilisateur (éviction LRU)"""
+        self._user_cache[(kind, user_id)] = (value, time.monotonic() + self.cache_ttl_seconds)
+        self._user_cache.move_to_end((kind, user_id))
+        while len(self._user_cache) > self.cache_max_entries:
+            self._user_cache.popitem(last=False)
+    
+    @staticmethod
+    def format_conversation_history(memories: List[Dict[str, Any]], max_chars: int = 2000) -> str:
+        """Sérialise les souvenirs en texte compact et déterministe, borné en taille"""
+        parts = []
+        total = 0
+        
+        # Souvenirs déjà triés par pertinence : on garde les plus pertinents dans le budget
+        for memory in memories:
+            exchange = f"Utilisateur: {memory.get('user_message', '')}\nAssistant: {memory.get('ai_response', '')}"
+            remaining = max_chars - total
+            if len(exchange) > remaining:
+                # Échange tronqué au budget restant (le plus pertinent n'est jamais perdu)
+                if remaining > 0:
+                    parts.append(exchange[:remaining - 1].rstrip() + "…")
+                break
+            parts.append(exchange)
+            total += len(exchange) + 1
+        
+        return "\n".join(parts)
+    
+    async def _get_user_context(self, user_id: str, ctx: Optional[RequestCtx] = None) -> str:
         """Récupère le contexte utilisateur complet"""
         try:
-            # Récupérer le profil comportemental
-            behavior_profile = await self.db.user_behavior_profiles.find_one({'user_id': user_id})
-            
-            # Récupérer les préférences
-            user_profile = await self.db.users.find_one({'id': user_id})
+            cached = self._get_cached('user_context', user_id)
+            if cached is not None:
+                return cached
             
-            # Récupérer l'historique d'onboarding
-            onboarding = await self.db.onboarding_profiles.find_one({'user_id': user_id})
+            if ctx is None:
+                # Profil comportemental, préférences et onboarding en un seul aller-retour
+                ctx = await RequestCtx.load(self.db, user_id)
+                if ctx is None:
+                    return "Contexte non disponible"
+            onboarding, behavior_profile = ctx.onboarding, ctx.behavior
             
             context_parts = []
             
             if onboarding:
-                context_parts.append(f"Objectif principal: {onboarding.get('objective', 'Non défini')}")
-                context_parts.append(f"Domaine: {onboarding.get('domain', 'Non défini')}")
-                context_parts.append(f"Niveau: {onboarding.get('current_level', 'Non défini')}")
+                context_parts.append(f"Objectif principal: {_truncate(onboarding.get('objective', 'Non défini'), MAX_FIELD_CHARS)}")
+                context_parts.append(f"Domaine: {_truncate(onboarding.get('domain', 'Non défini'), MAX_FIELD_CHARS)}")
+                context_parts.append(f"Niveau: {_truncate(onboarding.get('current_level', 'Non défini'), MAX_FIELD_CHARS)}")
             
             if behavior_profile:
                 context_parts.append(f"Style de motivation: {behavior_profile.get('motivation_type', 'equilibré')}")
                 context_parts.append(f"Tendance procrastination: {behavior_profile.get('procrastination_tendency', 'inconnue')}")
             
-            return " | ".join(context_parts) if context_parts else "Contexte utilisateur en cours de construction"
+            if context_parts:
+                user_context = _truncate(" | ".join(context_parts), MAX_CONTEXT_CHARS)
+            else:
+                user_context = "Contexte utilisateur en cours de construction"
+            self._set_cached('user_context', user_id, user_context)
+            
+            return user_context
             
         except Exception as e:
             logger.error(f"Erreur récupération contexte utilisateur: {e}")
@@ -177,25 +317,35 @@ Le message doit être naturel, empathique et actionnable."""
     async def _get_user_goals(self, user_id: str) -> str:
         """Récupère les objectifs actuels de l'utilisateur"""
         try:
+            cached = self._get_cached('user_goals', user_id)
+            if cached is not None:
+                return cached
+            
             goals = await self.db.goals.find(
-                {'user_id': user_id, 'status': 'active'}
+                {'user_id': user_id, 'status': 'active'},
+                projection={'_id': 0, 'title': 1, 'description': 1}
             ).limit(5).to_list(length=5)
             
-            if not goals:
-                return "Aucun objectif actif défini"
+            if goals:
+                goals_text = []
+                for goal in goals:
+                    title = _truncate(goal.get('title') or 'Sans titre', MAX_GOAL_TITLE_CHARS)
+                    description = _truncate(goal.get('description'), MAX_FIELD_CHARS)
+                    goals_text.append(f"- {title}: {description}")
+                current_goals = _truncate("\n".join(goals_text), MAX_CONTEXT_CHARS)
+            else:
+                current_goals = "Aucun objectif actif défini"
             
-            goals_text = []
-            for goal in goals:
-                goals_text.append(f"- {goal.get('title', 'Sans titre')}: {goal.get('description', '')}")
+            self._set_cached('user_goals', user_id, current_goals)
             
-            return "\n".join(goals_text)
+            return current_goals
             
         except Exception as e:
             logger.error(f"Erreur récupération objectifs: {e}")
             return "Objectifs non disponibles"
     
     async def _log_prompt_usage(self, prompt_type: str, user_id: str):
-        """Log l'utilisation des prompts pour analytics"""
+        """Log l'utilisation des prompts pour analytics (écriture par lots)"""
         try:
             usage_log = {
                 'prompt_type': prompt_type,
@@ -204,40 +354,97 @@ Le message doit être naturel, empathique et actionnable."""
                 'usage_count': 1
             }
             
-            await self.db.prompt_usage_logs.insert_one(usage_log)
+            self._usage_buffer.append(usage_log)
+            
+            # Vider le buffer en tâche de fond tous les 100 logs ou toutes les 5 secondes
+            if len(self._usage_buffer) >= 100 or time.monotonic() - self._last_usage_flush >= 5:
+                self._last_usage_flush = time.monotonic()
+                task = asyncio.create_task(self.flush_usage_logs())
+                self._bg_tasks.add(task)
+                task.add_done_callback(self._bg_tasks.discard)
             
         except Exception as e:
             logger.warning(f"Erreur log prompt usage: {e}")
     
+    async def flush_usage_logs(self):
+        """Écrit en base les logs d'utilisation en attente (à appeler aussi à l'arrêt)"""
+        async with self._usage_lock:
+            if not self._usage_buffer:
+                return
+            
+            batch, self._usage_buffer = self._usage_buffer, []
+            self._last_usage_flush = time.monotonic()
+            
+            try:
+                await self.db.prompt_usage_logs.insert_many(batch, ordered=False)
+            except Exception as e:
+                logger.warning(f"Erreur écriture logs prompt usage ({len(batch)} perdus): {e}")
+                return
+            
+            # Agrégat journalier (jour, type de prompt, utilisateur) pour les analytics
+            try:
+                daily_counts = Counter(
+                    (log['timestamp'].replace(hour=0, minute=0, second=0, microsecond=0), log['prompt_type'], log['user_id'])
+                    for log in batch
+                )
+                await self.db.prompt_usage_daily.bulk_write([
+                    UpdateOne(
+                        {'date': date, 'prompt_type': prompt_type, 'user_id': user_id},
+                        {'$inc': {'usage_count': count}},
+                        upsert=True
+                    )
+                    for (date, prompt_type, user_id), count in daily_counts.items()
+                ], ordered=False)
+            except Exception as e:
+                logger.warning(f"Erreur agrégat journalier prompt usage: {e}")
+    
     async def update_base_prompt(self, prompt_type: str, new_prompt: str, admin_id: str) -> bool:
-        """Met à jour un prompt de base (admin seulement)"""
+        """Met à jour un prompt de base (admin seulement)
+
+        coaching_base est envoyé tel quel (préfixe statique) : une surcharge contenant des placeholders est refusée.
+        """
         try:
-            # Sauvegarder l'ancien prompt
-            backup = {
-                'prompt_type': prompt_type,
-                'old_prompt': self.base_prompts.get(prompt_type, ''),
-                'new_prompt': new_prompt,
-                'updated_by': admin_id,
-                'updated_at': datetime.utcnow()
-            }
+            compiled = _compile_prompt(new_prompt)
+            if prompt_type == 'coaching_base' and compiled[1]:
+                logger.warning(
+                    f"Prompt coaching_base refusé : placeholders {sorted(compiled[1])} non substitués, "
+                    f"les champs propres à chaque tour vont dans coaching_context"
+                )
+                return False
             
-            await self.db.prompt_backups.insert_one(backup)
-            
-            # Mettre à jour le prompt
-            self.base_prompts[prompt_type] = new_prompt
+            updated_at = datetime.utcnow()
+            default_prompt = self.get_base_prompt(prompt_type) or ''
             
-            # Sauvegarder en base
-            await self.db.system_prompts.replace_one(
+            # Remplacer en base et récupérer l'ancienne version en un seul aller-retour
+            previous = await self.db.system_prompts.find_one_and_replace(
                 {'prompt_type': prompt_type},
                 {
                     'prompt_type': prompt_type,
                     'prompt_content': new_prompt,
                     'updated_by': admin_id,
-                    'updated_at': datetime.utcnow()
+                    'updated_at': updated_at
                 },
-                upsert=True
+                projection={'_id': 0, 'prompt_content': 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
             )
             
+            # Mettre à jour le prompt
+            self._overrides[prompt_type] = new_prompt
+            self._compiled_overrides[prompt_type] = compiled
+            
+            # Historique conservé hors du chemin de la requête admin
+            backup = {
+                'prompt_type': prompt_type,
+                'old_prompt': previous['prompt_content'] if previous else default_prompt,
+                'new_prompt': new_prompt,
+                'updated_by': admin_id,
+                'updated_at': updated_at
+            }
+            task = asyncio.create_task(self._save_prompt_backup(backup))
+            self._bg_tasks.add(task)
+            task.add_done_callback(self._bg_tasks.discard)
+            
             logger.info(f"Prompt {prompt_type} mis à jour par {admin_id}")
             return True
             
@@ -245,28 +452,40 @@ Le message doit être naturel, empathique et actionnable."""
             logger.error(f"Erreur mise à jour prompt: {e}")
             return False
     
+    async def _save_prompt_backup(self, backup: Dict[str, Any]):
+        """Archive l'ancienne version d'un prompt"""
+        try:
+            await self.db.prompt_backups.insert_one(backup)
+        except Exception as e:
+            logger.warning(f"Erreur sauvegarde historique prompt {backup['prompt_type']}: {e}")
+    
     async def get_prompt_analytics(self, days: int = 30) -> Dict[str, Any]:
         """Récupère les analytics d'utilisation des prompts"""
         try:
-            cutoff_date = datetime.utcnow().replace(
-                day=datetime.utcnow().day - days
+            cutoff_date = (datetime.utcnow() - timedelta(days=days)).replace(
+                hour=0, minute=0, second=0, microsecond=0
             )
             
+            # Lecture de l'agrégat journalier plutôt que des événements bruts
             pipeline = [
-                {'$match': {'timestamp': {'$gte': cutoff_date}}},
+                {'$match': {'date': {'$gte': cutoff_date}}},
+                {'$group': {
+                    '_id': {'prompt_type': '$prompt_type', 'user_id': '$user_id'},
+                    'usage_count': {'$sum': '$usage_count'}
+                }},
                 {'$group': {
-                    '_id': '$prompt_type',
+                    '_id': '$_id.prompt_type',
                     'usage_count': {'$sum': '$usage_count'},
-                    'unique_users': {'$addToSet': '$user_id'}
+                    'unique_users_count': {'$sum': 1}
                 }},
                 {'$project': {
                     'prompt_type': '$_id',
                     'usage_count': 1,
-                    'unique_users_count': {'$size': '$unique_users'}
+                    'unique_users_count': 1
                 }}
             ]
             
-            analytics = await self.db.prompt_usage_logs.aggregate(pipeline).to_list(length=None)
+            analytics = await self.db.prompt_usage_daily.aggregate(pipeline).to_list(length=None)
             
             return {
                 'period_days': days,
@@ -3,31 +3,54 @@
 Corrige les problèmes de gestion des conversations multiples et leur persistance
 """
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
 import logging
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 
 logger = logging.getLogger(__name__)
 
 class ConversationManager:
     """Gestionnaire principal des conversations avec corrections critiques"""
     
+    # Champs des messages renvoyés au client (évite de transférer les métadonnées volumineuses)
+    MESSAGE_PROJECTION = {
+        '_id': 0, 'id': 1, 'conversation_id': 1, 'user_id': 1,
+        'message': 1, 'response': 1, 'timestamp': 1, 'tasks_extracted': 1
+    }
+    
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         
-    async def create_conversation(self, user_id: str, title: str = "Nouvelle conversation") -> Dict[str, Any]:
-        """Crée une nouvelle conversation avec validation appropriée"""
+    async def ensure_indexes(self):
+        """Crée les index composés des requêtes de conversations (au démarrage)"""
+        # Conversations actives d'un utilisateur, les plus récentes d'abord
+        await self.db.conversations.create_index([('user_id', 1), ('is_active', 1), ('updated_at', -1)], background=True)
+        # Accès direct avec vérification de propriété
+        await self.db.conversations.create_index([('id', 1), ('user_id', 1)], background=True)
+        # Nettoyage des conversations inactives
+        await self.db.conversations.create_index([('is_active', 1), ('message_count', 1), ('created_at', 1)], background=True)
+        
+    async def create_conversation(self,
+                                  user_id: str,
+                                  title: str = "Nouvelle conversation",
+                                  first_message: bool = False) -> Dict[str, Any]:
+        """Crée une nouvelle conversation avec validation appropriée
+
+        first_message=True compte directement le premier message (création depuis le chat).
+        """
         try:
+            now = datetime.utcnow()
             conversation = {
                 'id': str(uuid.uuid4()),
                 'user_id': user_id,
                 'title': title,
-                'created_at': datetime.utcnow(),
-                'updated_at': datetime.utcnow(),
+                'created_at': now,
+                'updated_at': now,
                 'is_active': True,
-                'message_count': 0,
-                'last_message_at': None,
+                'message_count': 1 if first_message else 0,
+                'last_message_at': now if first_message else None,
                 'metadata': {}
             }
             
@@ -52,6 +75,35 @@ class ConversationManager:
             logger.error(f"Erreur récupération conversations: {e}")
             return []
     
+    async def get_user_conversations_with_last_message(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Récupère les conversations d'un utilisateur avec leur dernier message en une seule requête"""
+        try:
+            pipeline = [
+                {'$match': {'user_id': user_id, 'is_active': True}},
+                {'$sort': {'updated_at': -1}},
+                {'$limit': limit},
+                {'$lookup': {
+                    'from': 'messages',
+                    'let': {'cid': '$id'},
+                    'pipeline': [
+                        {'$match': {'$expr': {'$eq': ['$conversation_id', '$$cid']}}},
+                        {'$sort': {'timestamp': -1}},
+                        {'$limit': 1},
+                        {'$project': {'_id': 0, 'message': 1, 'timestamp': 1}}
+                    ],
+                    'as': 'last_message'
+                }},
+                {'$addFields': {'last_message': {'$arrayElemAt': ['$last_message', 0]}}}
+            ]
+            
+            conversations = await self.db.conversations.aggregate(pipeline).to_list(length=limit)
+            
+            return conversations
+            
+        except Exception as e:
+            logger.error(f"Erreur récupération conversations: {e}")
+            return []
+    
     async def get_conversation_by_id(self, conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Récupère une conversation spécifique avec vérification de propriété"""
         try:
@@ -66,6 +118,27 @@ class ConversationManager:
             logger.error(f"Erreur récupération conversation {conversation_id}: {e}")
             return None
     
+    async def record_message(self, conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Vérifie la propriété et compte un nouveau message en une seule opération atomique
+
+        Retourne None si la conversation n'existe pas, est inactive ou appartient à un autre utilisateur.
+        """
+        try:
+            now = datetime.utcnow()
+            return await self.db.conversations.find_one_and_update(
+                {'id': conversation_id, 'user_id': user_id, 'is_active': True},
+                {
+                    '$inc': {'message_count': 1},
+                    '$set': {'last_message_at': now, 'updated_at': now}
+                },
+                projection={'_id': 0, 'id': 1, 'title': 1, 'message_count': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            
+        except Exception as e:
+            logger.error(f"Erreur enregistrement message conversation {conversation_id}: {e}")
+            return None
+    
     async def update_conversation(self, conversation_id: str, user_id: str, **updates) -> bool:
         """Met à jour une conversation avec validation"""
         try:
@@ -131,7 +204,8 @@ class ConversationManager:
                 return []
             
             messages = await self.db.messages.find(
-                {'conversation_id': conversation_id}
+                {'conversation_id': conversation_id},
+                projection=self.MESSAGE_PROJECTION
             ).sort('timestamp', 1).limit(limit).to_list(length=limit)
             
             return messages
@@ -140,30 +214,50 @@ class ConversationManager:
             logger.error(f"Erreur récupération messages: {e}")
             return []
     
-    async def cleanup_inactive_conversations(self, days_threshold: int = 30) -> int:
-        """Nettoie les conversations inactives anciennes"""
+    async def cleanup_inactive_conversations(self, days_threshold: int = 30, batch_size: int = 1000) -> int:
+        """Nettoie les conversations inactives anciennes (par lots)"""
         try:
-            cutoff_date = datetime.utcnow().replace(
-                day=datetime.utcnow().day - days_threshold
-            )
+            cutoff_date = datetime.utcnow() - timedelta(days=days_threshold)
+            # Conversations vides créées avant la date limite (last_message_at est None sans message)
+            inactive_filter = {
+                'is_active': True,
+                'message_count': 0,
+                'created_at': {'$lt': cutoff_date}
+            }
             
-            result = await self.db.conversations.update_many(
-                {
-                    'last_message_at': {'$lt': cutoff_date},
-                    'is_active': True,
-                    'message_count': 0
-                },
-                {
-                    '$set': {
-                        'is_active': False,
-                        'cleanup_reason': 'inactive_threshold',
-                        'updated_at': datetime.utcnow()
+            # Pagination par _id : chaque lot est une mise à jour courte
+            modified = 0
+            last_id = None
+            while True:
+                batch_filter = dict(inactive_filter)
+                if last_id is not None:
+                    batch_filter['_id'] = {'$gt': last_id}
+                
+                batch = await self.db.conversations.find(
+                    batch_filter, projection={'_id': 1}
+                ).sort('_id', 1).limit(batch_size).to_list(length=batch_size)
+                if not batch:
+                    break
+                
+                last_id = batch[-1]['_id']
+                result = await self.db.conversations.update_many(
+                    # Filtre répété : une conversation ayant reçu un message entre-temps est conservée
+                    {'_id': {'$in': [doc['_id'] for doc in batch]}, **inactive_filter},
+                    {
+                        '$set': {
+                            'is_active': False,
+                            'cleanup_reason': 'inactive_threshold',
+                            'updated_at': datetime.utcnow()
+                        }
                     }
-                }
-            )
+                )
+                modified += result.modified_count
+                
+                if len(batch) < batch_size:
+                    break
             
-            return result.modified_count
+            return modified
             
         except Exception as e:
             logger.error(f"Erreur nettoyage conversations: {e}")
-            return 0
\ No newline at end of file
+            return 0
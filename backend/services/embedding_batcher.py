@@ -0,0 +1,113 @@
+"""
+📦 Regroupement des calculs d'embeddings
+Mutualise les appels au modèle SentenceTransformer entre requêtes concurrentes
+"""
+from typing import List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import logging
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """File d'attente d'embeddings normalisés traitée par lots dans un worker asynchrone, avec cache LRU"""
+
+    def __init__(self,
+                 embedding_model: SentenceTransformer,
+                 max_batch_size: int = 32,
+                 max_wait_ms: int = 10,
+                 cache_max_entries: int = 4096):
+        self.embedding_model = embedding_model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.cache_max_entries = cache_max_entries
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # empreinte blake2b du texte -> embedding (lecture seule)
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Calcule l'embedding normalisé d'un texte (cache, sinon regroupé avec les demandes concurrentes)"""
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        embedding = await future
+
+        embedding.setflags(write=False)
+        self._cache[key] = embedding
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+        return embedding
+
+    async def close(self):
+        """Arrête le worker (les demandes en attente sont annulées)"""
+        if self._worker is None:
+            return
+
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while self._queue and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    def _ensure_worker(self):
+        """Démarre le worker au premier appel (une boucle d'événements doit tourner)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """Vide la file par lots de max_batch_size ou toutes les max_wait_ms millisecondes"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._encode_batch(batch)
+
+    async def _encode_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Encode un lot hors de la boucle d'événements et résout les demandes"""
+        try:
+            embeddings = await asyncio.to_thread(
+                self.embedding_model.encode,
+                [text for text, _ in batch],
+                batch_size=self.max_batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+        except Exception as e:
+            logger.error(f"Erreur calcul embeddings par lot ({len(batch)} textes): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
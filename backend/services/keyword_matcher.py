@@ -0,0 +1,93 @@
+"""
+🔤 Détection de mots-clés en un seul passage
+Automate Aho–Corasick partagé par les analyses de texte de la mémoire
+"""
+from typing import Dict, Hashable, Iterable, Iterator, List, Set, Tuple
+from collections import defaultdict
+import logging
+
+try:
+    import ahocorasick  # Optionnel : paquet pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+class KeywordMatcher:
+    """Associe chaque mot-clé à ses catégories et retrouve toutes les occurrences (sous-chaînes, chevauchements inclus)
+
+    whole_words=True ne retient que les occurrences délimitées par des caractères hors mot.
+    """
+
+    def __init__(self, categories: Dict[Hashable, Iterable[str]], whole_words: bool = False):
+        self.whole_words = whole_words
+        # mot-clé -> catégories (un même mot peut appartenir à plusieurs catégories)
+        keyword_categories: Dict[str, Set[Hashable]] = defaultdict(set)
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                keyword_categories[keyword.lower()].add(category)
+
+        self._keywords: Tuple[Tuple[str, frozenset], ...] = tuple(
+            (keyword, frozenset(cats)) for keyword, cats in keyword_categories.items()
+        )
+
+        self._automaton = None
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, cats in self._keywords:
+                self._automaton.add_word(keyword, (keyword, cats))
+            self._automaton.make_automaton()
+        else:
+            logger.info("pyahocorasick non installé : recherche de mots-clés par sous-chaînes")
+
+    def scan(self, text: str) -> Dict[Hashable, Set[str]]:
+        """Retourne, pour chaque catégorie présente, l'ensemble des mots-clés trouvés dans le texte"""
+        return self.scan_split(text, 0)[0]
+
+    def scan_split(self, text: str, prefix_length: int) -> Tuple[Dict[Hashable, Set[str]], Dict[Hashable, Set[str]]]:
+        """Comme scan, et sépare en plus les mots-clés contenus entièrement dans les prefix_length premiers caractères"""
+        found: Dict[Hashable, Set[str]] = defaultdict(set)
+        found_in_prefix: Dict[Hashable, Set[str]] = defaultdict(set)
+
+        for _, end, keyword, cats in self._iter_hits(text.lower()):
+            in_prefix = end <= prefix_length
+            for category in cats:
+                found[category].add(keyword)
+                if in_prefix:
+                    found_in_prefix[category].add(keyword)
+
+        return found, found_in_prefix
+
+    def matches(self, text: str) -> List[Tuple[int, str, frozenset]]:
+        """Retourne les occurrences (position de début, mot-clé, catégories) dans l'ordre du texte"""
+        hits = [(start, keyword, cats) for start, _, keyword, cats in self._iter_hits(text.lower())]
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+    def _iter_hits(self, text_lower: str) -> Iterator[Tuple[int, int, str, frozenset]]:
+        """Parcourt les occurrences (début, fin exclue, mot-clé, catégories) du texte déjà en minuscules"""
+        if self._automaton is not None:
+            # Un seul passage linéaire sur le texte
+            for end_index, (keyword, cats) in self._automaton.iter(text_lower):
+                start, end = end_index - len(keyword) + 1, end_index + 1
+                if not self.whole_words or _is_delimited(text_lower, start, end):
+                    yield start, end, keyword, cats
+        else:
+            # Chaque mot-clé distinct n'est cherché qu'une fois, toutes catégories confondues
+            for keyword, cats in self._keywords:
+                start = text_lower.find(keyword)
+                while start != -1:
+                    end = start + len(keyword)
+                    if not self.whole_words or _is_delimited(text_lower, start, end):
+                        yield start, end, keyword, cats
+                    start = text_lower.find(keyword, start + 1)
+
+
+def _is_delimited(text: str, start: int, end: int) -> bool:
+    """Vrai si text[start:end] n'est pas collé à un autre caractère de mot"""
+    return (start == 0 or not _is_word_char(text[start - 1])) and (end == len(text) or not _is_word_char(text[end]))
+
+
+def _is_word_char(char: str) -> bool:
+    """Même définition que \\w des expressions régulières"""
+    return char.isalnum() or char == '_'
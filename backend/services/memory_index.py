@@ -0,0 +1,111 @@
+"""
+🔎 Index vectoriel des souvenirs
+Recherche des plus proches voisins sur l'ensemble de la mémoire d'un utilisateur
+"""
+from typing import List, Dict, Any, Tuple
+from collections import OrderedDict
+import time
+import logging
+import numpy as np
+from .similarity import normalize_rows, topk_cosine
+
+try:
+    import faiss  # Optionnel : produit scalaire SIMD sur index plat
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+class MemoryVectorIndex:
+    """Index en mémoire par utilisateur : vecteurs normalisés (FAISS IndexFlatIP ou matrice numpy) + ids alignés
+
+    Empreinte bornée : au plus max_users utilisateurs de max_memories_per_user souvenirs (les plus récents).
+    """
+
+    def __init__(self,
+                 max_users: int = 200,
+                 ttl_seconds: int = 600,
+                 use_faiss: bool = True,
+                 max_memories_per_user: int = 2000):
+        self.max_users = max_users
+        self.max_memories_per_user = max_memories_per_user
+        self.ttl_seconds = ttl_seconds
+        self.use_faiss = use_faiss and faiss is not None
+        # user_id -> {'ids': [str], 'matrix': float32[N, D] | faiss.IndexFlatIP, 'loaded_at': float}
+        self._users: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def is_loaded(self, user_id: str) -> bool:
+        """Indique si l'index de l'utilisateur est chargé et encore frais"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return False
+        if time.monotonic() - entry['loaded_at'] > self.ttl_seconds:
+            # Rechargement périodique : les autres workers ont pu écrire de nouveaux souvenirs
+            del self._users[user_id]
+            return False
+        return True
+
+    def load(self, user_id: str, ids: List[str], embeddings: List[Any]):
+        """Charge (ou recharge) l'index complet d'un utilisateur"""
+        if ids:
+            matrix = self._build(normalize_rows(embeddings))
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+
+        self._users[user_id] = {'ids': list(ids), 'matrix': matrix, 'loaded_at': time.monotonic()}
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def add(self, user_id: str, memory_id: str, embedding: Any):
+        """Ajoute un souvenir à l'index de l'utilisateur s'il est chargé"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return
+        if len(entry['ids']) >= self.max_memories_per_user:
+            # Index plein : rechargé au prochain accès avec les souvenirs les plus récents
+            del self._users[user_id]
+            return
+
+        row = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+        if not entry['ids']:
+            entry['matrix'] = self._build(row)
+        elif self.use_faiss:
+            entry['matrix'].add(row)
+        else:
+            entry['matrix'] = np.vstack([entry['matrix'], row])
+        entry['ids'].append(memory_id)
+
+    def search(self, user_id: str, query_embedding: Any, k: int) -> List[Tuple[str, float]]:
+        """Retourne les k souvenirs les plus similaires (id, similarité cosinus)"""
+        entry = self._users.get(user_id)
+        if entry is None or not entry['ids']:
+            return []
+
+        self._users.move_to_end(user_id)
+        query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))
+
+        if self.use_faiss:
+            scores, top = entry['matrix'].search(query, min(k, len(entry['ids'])))
+            top, scores = top[0], scores[0]
+        else:
+            top, scores = topk_cosine(entry['matrix'], query[0], k)
+
+        return [(entry['ids'][i], float(score)) for i, score in zip(top, scores) if i >= 0]
+
+    def invalidate(self, user_id: str):
+        """Oublie l'index d'un utilisateur"""
+        self._users.pop(user_id, None)
+
+    def clear(self):
+        """Oublie tous les index (après suppression de souvenirs)"""
+        self._users.clear()
+
+    def _build(self, matrix: np.ndarray) -> Any:
+        """Construit la structure de recherche à partir de vecteurs déjà normalisés"""
+        if not self.use_faiss:
+            return matrix
+        index = faiss.IndexFlatIP(matrix.shape[1])
+        index.add(matrix)
+        return index
+
@@ -2,26 +2,165 @@
 🧠 Système de mémoire conversationnelle intelligent - CORRECTION CRITIQUE #4
 Corrige la persistance et l'utilisation de la mémoire conversationnelle
 """
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Mapping
+from types import MappingProxyType
 import json
+from collections import Counter
+import re
 from datetime import datetime, timedelta
+import asyncio
 import logging
 import numpy as np
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson.binary import Binary
+from pymongo import WriteConcern, UpdateOne, ReturnDocument
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import openai
-from openai import OpenAI
+from openai import AsyncOpenAI
+from .embedding_batcher import EmbeddingBatcher
+from .memory_index import MemoryVectorIndex
+from .similarity import normalize_rows
+from .keyword_matcher import KeywordMatcher
+from .request_context import RequestCtx
 
 logger = logging.getLogger(__name__)
 
+def _keyword_set(keywords: List[str]) -> frozenset:
+    """Normalise une liste de mots-clés en ensemble figé (minuscules, une seule fois à l'import)"""
+    return frozenset(keyword.lower() for keyword in keywords)
+
+# Mots-clés des analyses de texte (topics, émotions, importance, préférences), en lecture seule
+TOPIC_KEYWORDS: Mapping[str, frozenset] = MappingProxyType({
+    topic: _keyword_set(keywords) for topic, keywords in {
+        'business': ['business', 'entreprise', 'startup', 'marketing', 'vente'],
+        'développement_personnel': ['développement', 'croissance', 'habitude', 'mindset'],
+        'santé': ['santé', 'sport', 'nutrition', 'fitness', 'bien-être'],
+        'éducation': ['apprendre', 'étudier', 'formation', 'compétence', 'cours'],
+        'technologie': ['tech', 'programmation', 'code', 'développement', 'app'],
+        'créativité': ['créatif', 'art', 'design', 'écriture', 'musique'],
+        'finances': ['argent', 'budget', 'investissement', 'épargne', 'finance']
+    }.items()
+})
+EMOTION_KEYWORDS: Mapping[str, frozenset] = MappingProxyType({
+    emotion: _keyword_set(keywords) for emotion, keywords in {
+        'positif': ['heureux', 'content', 'motivé', 'enthousiaste', 'super', 'génial'],
+        'négatif': ['triste', 'déçu', 'frustré', 'difficile', 'problème', 'inquiet'],
+        'neutre': ['normal', 'ok', 'bien', 'standard'],
+        'déterminé': ['déterminé', 'motivé', 'prêt', 'go', 'action', 'objectif']
+    }.items()
+})
+IMPORTANCE_KEYWORDS = _keyword_set([
+    'important', 'urgent', 'objectif', 'goal', 'décision', 'problème',
+    'solution', 'projet', 'plan', 'échéance', 'deadline'
+])
+GOAL_KEYWORDS = _keyword_set(['objectif', 'goal', 'veux', 'souhaite', 'planifie', 'projet'])
+POSITIVE_INDICATORS = _keyword_set(['merci', 'parfait', 'excellent', 'super', 'génial'])
+NEGATIVE_INDICATORS = _keyword_set(['trop long', 'compliqué', 'pas clair'])
+
+def _keyword_pattern(keywords: frozenset) -> str:
+    """Expression régulière (sous-chaînes) des mots-clés, pour $regexMatch côté MongoDB"""
+    return '|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+
+_GOAL_PATTERN = _keyword_pattern(GOAL_KEYWORDS)
+_POSITIVE_PATTERN = _keyword_pattern(POSITIVE_INDICATORS)
+_NEGATIVE_PATTERN = _keyword_pattern(NEGATIVE_INDICATORS)
+
+# Consignes de résumé (préfixe statique : réutilisé par le cache de prompts du fournisseur)
+SUMMARY_INSTRUCTIONS = """Analyse la conversation fournie et génère un résumé structuré.
+
+Instructions :
+1. Résume les points clés de la conversation
+2. Identifie les objectifs ou intentions de l'utilisateur
+3. Note les progrès ou difficultés mentionnés
+4. Liste les décisions ou engagements pris
+
+Réponds en JSON :
+{
+    "summary": "résumé en 2-3 phrases",
+    "key_points": ["point1", "point2", "point3"],
+    "user_objectives": ["objectif1", "objectif2"],
+    "commitments": ["engagement1", "engagement2"],
+    "next_actions": ["action1", "action2"]
+}"""
+
+# Embeddings stockés en vecteur BSON (sous-type 9, compatible Atlas Vector Search)
+# quantifiés en int8 : 4x plus compacts que le float32, classement cosinus préservé au bruit près
+# (float32 quand $vectorSearch est utilisé : un index Atlas n'accepte qu'un seul type de vecteur)
+_BSON_VECTOR_SUBTYPE = 9
+_BSON_VECTOR_INT8 = 0x03
+_BSON_VECTOR_FLOAT32 = 0x27
+
+def _embedding_to_bson(embedding: np.ndarray, quantize: bool = True) -> Binary:
+    """Encode un embedding en vecteur BSON, quantifié en int8 (échelle par vecteur : max |v| -> 127) ou en float32"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    if not quantize:
+        return Binary(bytes([_BSON_VECTOR_FLOAT32, 0]) + vector.astype('<f4').tobytes(), subtype=_BSON_VECTOR_SUBTYPE)
+    peak = float(np.abs(vector).max()) if vector.size else 0.0
+    quantized = np.round(vector * (127.0 / peak)) if peak > 0 else np.zeros_like(vector)
+    data = quantized.astype(np.int8).tobytes()
+    return Binary(bytes([_BSON_VECTOR_INT8, 0]) + data, subtype=_BSON_VECTOR_SUBTYPE)
+
+def _embedding_from_bson(value: Any) -> np.ndarray:
+    """Décode un embedding stocké (vecteur BSON int8/float32, octets float32 bruts ou ancienne liste de floats)
+
+    L'échelle int8 n'est pas conservée : la similarité cosinus y est insensible (vecteurs renormalisés à l'usage).
+    """
+    if isinstance(value, Binary) and value.subtype == _BSON_VECTOR_SUBTYPE:
+        if value[0] == _BSON_VECTOR_INT8:
+            return np.frombuffer(value, dtype=np.int8, offset=2).astype(np.float32)
+        return np.frombuffer(value, dtype='<f4', offset=2)
+    if isinstance(value, (bytes, bytearray)):
+        return np.frombuffer(value, dtype='<f4')
+    return np.asarray(value, dtype=np.float32)
+
 class MemorySystem:
     """Système de mémoire conversationnelle avancé avec embeddings et synthèse"""
     
-    def __init__(self, db: AsyncIOMotorDatabase, openai_client: OpenAI, embedding_model: SentenceTransformer):
+    def __init__(self,
+                 db: AsyncIOMotorDatabase,
+                 openai_client: AsyncOpenAI,
+                 embedding_model: SentenceTransformer,
+                 use_vector_index: bool = True,
+                 vector_search_index: Optional[str] = None):
         self.db = db
         self.openai_client = openai_client
         self.embedding_model = embedding_model
+        # Embeddings calculés par lots entre requêtes concurrentes
+        self.embedding_batcher = EmbeddingBatcher(embedding_model)
+        # Index Atlas Vector Search (prioritaire s'il est configuré) : classement exécuté par MongoDB
+        self.vector_search_index = vector_search_index
+        # Index vectoriel (FAISS si installé) : recherche sur toute la mémoire au lieu des 50 derniers souvenirs
+        # (inutile avec $vectorSearch : jamais interrogé)
+        self.vector_index = MemoryVectorIndex() if use_vector_index and not vector_search_index else None
+        # Embeddings int8, sauf avec $vectorSearch (requête et index en float32, compression via `quantization` Atlas)
+        self.quantize_embeddings = not vector_search_index
+        # Tous les mots-clés dans un même automate, étiquetés par catégorie
+        self.keyword_matcher = KeywordMatcher({
+            **{('topic', topic): keywords for topic, keywords in TOPIC_KEYWORDS.items()},
+            **{('emotion', emotion): keywords for emotion, keywords in EMOTION_KEYWORDS.items()},
+            'importance': IMPORTANCE_KEYWORDS,
+            'goal': GOAL_KEYWORDS,
+            'positive': POSITIVE_INDICATORS,
+            'negative': NEGATIVE_INDICATORS
+        })
+        # Souvenirs écrits par lots (insert_many, sans accusé de réception)
+        self._unacked_memory = db.conversation_memory.with_options(write_concern=WriteConcern(w=0))
+        self._memory_buffer: List[Dict[str, Any]] = []
+        # Lot en cours d'écriture (encore absent de la base, visible par la recherche)
+        self._flushing_memories: List[Dict[str, Any]] = []
+        self._memory_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.memory_flush_size = 100
+        self.memory_flush_delay = 0.05
+        # Compteurs de souvenirs par utilisateur, incrémentés à chaque lot (w=0)
+        # Collection séparée : un profil comportemental n'existe qu'après une analyse réelle
+        self._unacked_synthesis_state = db.memory_synthesis_state.with_options(write_concern=WriteConcern(w=0))
+        # Synthèse de profil planifiée hors du chemin d'écriture (balayage périodique)
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self.synthesis_min_interval = timedelta(hours=1)
+        self.synthesis_every = 50
+        self.synthesis_concurrency = 8
+        # Réservation d'un utilisateur par un worker (libérée en fin d'analyse, ou expirée si le worker s'arrête)
+        self.synthesis_claim_timeout = timedelta(minutes=10)
         
     async def store_conversation_memory(self, 
                                      user_id: str, 
@@ -33,7 +172,8 @@ class MemorySystem:
         try:
             # Créer l'embedding du message et de la réponse
             combined_text = f"{message} {response}"
-            embedding = self.embedding_model.encode(combined_text).tolist()
+            embedding = await self.embedding_batcher.encode(combined_text)
+            scan = self._scan_text(message, combined_text)
             
             # Créer l'entrée mémoire
             memory_entry = {
@@ -43,19 +183,23 @@ class MemorySystem:
                 'user_message': message,
                 'ai_response': response,
                 'message_type': message_type,
-                'embedding': embedding,
+                'embedding': _embedding_to_bson(embedding, quantize=self.quantize_embeddings),
                 'timestamp': datetime.utcnow(),
-                'importance_score': self._calculate_importance_score(message, response),
-                'topics_mentioned': await self._extract_topics(combined_text),
-                'emotions_detected': self._detect_emotions(message),
+                'importance_score': self._calculate_importance_score(message, response, scan=scan),
+                'topics_mentioned': scan['topics'],
+                'emotions_detected': scan['emotions'],
                 'metadata': {}
             }
             
-            # Stocker en base
-            await self.db.conversation_memory.insert_one(memory_entry)
-            
-            # Déclencher la synthèse périodique si nécessaire
-            await self._trigger_memory_synthesis(user_id)
+            # Stocker en base (par lots : visible en lecture après au plus memory_flush_delay)
+            self._memory_buffer.append(memory_entry)
+            # Ajout à l'index sans attente intermédiaire (un rechargement concurrent reprend le buffer)
+            if self.vector_index is not None:
+                self.vector_index.add(user_id, memory_entry['id'], embedding)
+            if len(self._memory_buffer) >= self.memory_flush_size:
+                await self.flush_memories()
+            elif self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._delayed_flush())
             
             logger.info(f"Mémoire conversationnelle stockée pour {user_id}")
             return True
@@ -64,6 +208,50 @@ class MemorySystem:
             logger.error(f"Erreur stockage mémoire: {e}")
             return False
     
+    async def ensure_indexes(self):
+        """Crée les index composés des requêtes de la mémoire (au démarrage)"""
+        # Souvenirs récents d'un utilisateur (recherche, profil, analytics)
+        await self.db.conversation_memory.create_index([('user_id', 1), ('timestamp', -1)], background=True)
+        # Messages d'une conversation dans l'ordre (résumés)
+        await self.db.conversation_memory.create_index(
+            [('user_id', 1), ('conversation_id', 1), ('timestamp', 1)], background=True
+        )
+        # Nettoyage des souvenirs anciens et peu importants
+        await self.db.conversation_memory.create_index([('timestamp', 1), ('importance_score', 1)], background=True)
+        # Un état de synthèse par utilisateur (compteurs et réservation)
+        await self.db.memory_synthesis_state.create_index('user_id', unique=True, background=True)
+    
+    async def _delayed_flush(self):
+        """Vide le buffer de souvenirs après un court délai de regroupement"""
+        await asyncio.sleep(self.memory_flush_delay)
+        await self.flush_memories()
+    
+    async def flush_memories(self):
+        """Écrit en base les souvenirs en attente (à appeler aussi à l'arrêt)"""
+        async with self._memory_lock:
+            if not self._memory_buffer:
+                return
+            
+            batch, self._memory_buffer = self._memory_buffer, []
+            self._flushing_memories = batch
+            try:
+                await self._unacked_memory.insert_many(batch, ordered=False)
+            except Exception as e:
+                logger.error(f"Erreur écriture mémoire par lot ({len(batch)} perdus): {e}")
+                return
+            finally:
+                self._flushing_memories = []
+            
+            # Un seul $inc par utilisateur du lot (lu par le balayage de synthèse)
+            counts = Counter(memory['user_id'] for memory in batch)
+            try:
+                await self._unacked_synthesis_state.bulk_write([
+                    UpdateOne({'user_id': user_id}, {'$inc': {'memory_count': count}}, upsert=True)
+                    for user_id, count in counts.items()
+                ], ordered=False)
+            except Exception as e:
+                logger.warning(f"Erreur mise à jour compteurs mémoire: {e}")
+    
     async def retrieve_relevant_memories(self, 
                                        user_id: str, 
                                        query: str, 
@@ -72,7 +260,12 @@ class MemorySystem:
         """Récupère les souvenirs les plus pertinents pour une requête"""
         try:
             # Créer l'embedding de la requête
-            query_embedding = self.embedding_model.encode(query)
+            query_embedding = await self.embedding_batcher.encode(query)
+            
+            if self.vector_search_index:
+                return await self._retrieve_with_vector_search(user_id, query_embedding, limit, min_similarity)
+            if self.vector_index is not None:
+                return await self._retrieve_with_index(user_id, query_embedding, limit, min_similarity)
             
             # Récupérer toutes les mémoires de l'utilisateur (avec pagination future)
             memories = await self.db.conversation_memory.find(
@@ -82,85 +275,218 @@ class MemorySystem:
             if not memories:
                 return []
             
-            # Calculer les similarités
-            relevant_memories = []
+            memories = [memory for memory in memories if 'embedding' in memory]
+            if not memories:
+                return []
             
-            for memory in memories:
-                if 'embedding' not in memory:
-                    continue
-                
-                memory_embedding = np.array(memory['embedding'])
-                similarity = cosine_similarity(
-                    [query_embedding], 
-                    [memory_embedding]
-                )[0][0]
-                
-                if similarity >= min_similarity:
-                    memory['similarity_score'] = float(similarity)
-                    relevant_memories.append(memory)
+            # Calculer toutes les similarités en un seul produit matrice-vecteur
+            embeddings = normalize_rows(np.stack([_embedding_from_bson(memory['embedding']) for memory in memories]))
+            query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+            similarities = embeddings @ query
             
-            # Trier par pertinence et importance
-            relevant_memories.sort(
-                key=lambda x: (x['similarity_score'] * 0.7 + x.get('importance_score', 0.5) * 0.3),
-                reverse=True
-            )
+            relevant = np.flatnonzero(similarities >= min_similarity)
+            if not relevant.size:
+                return []
+            
+            # Trier par pertinence et importance (sélection partielle des k meilleurs)
+            importance = np.array([memories[i].get('importance_score', 0.5) for i in relevant], dtype=np.float32)
+            rank = similarities[relevant] * 0.7 + importance * 0.3
+            k = min(limit, rank.size)
+            top = np.argpartition(-rank, k - 1)[:k]
+            top = top[np.argsort(-rank[top])]
+            
+            relevant_memories = []
+            for i in top:
+                memory = memories[relevant[i]]
+                memory['similarity_score'] = float(similarities[relevant[i]])
+                relevant_memories.append(memory)
             
-            return relevant_memories[:limit]
+            return relevant_memories
             
         except Exception as e:
             logger.error(f"Erreur récupération mémoires: {e}")
             return []
     
+    async def _retrieve_with_index(self,
+                                   user_id: str,
+                                   query_embedding: np.ndarray,
+                                   limit: int,
+                                   min_similarity: float) -> List[Dict[str, Any]]:
+        """Récupère les souvenirs pertinents via l'index vectoriel de l'utilisateur"""
+        if not self.vector_index.is_loaded(user_id):
+            # Souvenirs les plus récents seulement (empreinte de l'index bornée)
+            max_memories = self.vector_index.max_memories_per_user
+            vectors = await self.db.conversation_memory.find(
+                {'user_id': user_id, 'embedding': {'$exists': True}},
+                projection={'_id': 0, 'id': 1, 'embedding': 1}
+            ).sort('timestamp', -1).limit(max_memories).to_list(length=max_memories)
+            # Souvenirs encore en attente d'écriture (w=0, par lots), plus récents que ceux de la base
+            loaded_ids = {vector['id'] for vector in vectors}
+            pending = [memory for memory in self._pending_memories(user_id) if memory['id'] not in loaded_ids]
+            vectors = (pending[::-1] + vectors)[:max_memories]
+            self.vector_index.load(
+                user_id,
+                [vector['id'] for vector in vectors],
+                [_embedding_from_bson(vector['embedding']) for vector in vectors]
+            )
+        
+        # Candidats élargis pour le reclassement par importance
+        hits = [
+            (memory_id, score)
+            for memory_id, score in self.vector_index.search(user_id, query_embedding, limit * 4)
+            if score >= min_similarity
+        ]
+        if not hits:
+            return []
+        
+        scores = dict(hits)
+        memories = await self.db.conversation_memory.find(
+            {'user_id': user_id, 'id': {'$in': list(scores)}},
+            projection={'embedding': 0}
+        ).to_list(length=len(scores))
+        # Souvenirs trouvés par l'index mais pas encore écrits en base
+        found_ids = {memory['id'] for memory in memories}
+        memories.extend(
+            {key: value for key, value in memory.items() if key not in ('_id', 'embedding')}
+            for memory in self._pending_memories(user_id)
+            if memory['id'] in scores and memory['id'] not in found_ids
+        )
+        
+        for memory in memories:
+            memory['similarity_score'] = scores[memory['id']]
+        
+        # Trier par pertinence et importance
+        memories.sort(
+            key=lambda x: (x['similarity_score'] * 0.7 + x.get('importance_score', 0.5) * 0.3),
+            reverse=True
+        )
+        
+        return memories[:limit]
+    
+    def _pending_memories(self, user_id: str) -> List[Dict[str, Any]]:
+        """Souvenirs de l'utilisateur pas encore écrits en base (buffer et lot en cours d'écriture)"""
+        return [
+            memory for memory in self._flushing_memories + self._memory_buffer
+            if memory['user_id'] == user_id
+        ]
+    
+    async def _retrieve_with_vector_search(self,
+                                           user_id: str,
+                                           query_embedding: np.ndarray,
+                                           limit: int,
+                                           min_similarity: float) -> List[Dict[str, Any]]:
+        """Récupère les souvenirs pertinents via $vectorSearch (MongoDB Atlas)"""
+        pipeline = [
+            {'$vectorSearch': {
+                'index': self.vector_search_index,
+                'path': 'embedding',
+                'queryVector': np.asarray(query_embedding, dtype=np.float32).tolist(),
+                'numCandidates': max(100, limit * 20),
+                # Candidats élargis pour le reclassement par importance
+                'limit': limit * 4,
+                'filter': {'user_id': user_id}
+            }},
+            {'$project': {'_id': 0, 'embedding': 0}},
+            # Score Atlas en similarité cosinus : (1 + cos) / 2, ramené dans [-1, 1]
+            {'$addFields': {
+                'similarity_score': {'$subtract': [{'$multiply': [{'$meta': 'vectorSearchScore'}, 2]}, 1]}
+            }},
+            {'$match': {'similarity_score': {'$gte': min_similarity}}},
+            # Trier par pertinence et importance
+            {'$addFields': {
+                'rank': {'$add': [
+                    {'$multiply': ['$similarity_score', 0.7]},
+                    {'$multiply': [{'$ifNull': ['$importance_score', 0.5]}, 0.3]}
+                ]}
+            }},
+            {'$sort': {'rank': -1}},
+            {'$limit': limit},
+            {'$project': {'rank': 0}}
+        ]
+        
+        return await self.db.conversation_memory.aggregate(pipeline).to_list(length=limit)
+    
     async def get_conversation_summary(self, 
                                     user_id: str, 
                                     conversation_id: str, 
                                     max_messages: int = 20) -> Dict[str, Any]:
-        """Génère un résumé intelligent d'une conversation"""
+        """Génère un résumé intelligent d'une conversation (incrémental, mis en cache)"""
         try:
-            # Récupérer les messages de la conversation
-            memories = await self.db.conversation_memory.find(
-                {
-                    'user_id': user_id,
-                    'conversation_id': conversation_id
-                }
-            ).sort('timestamp', 1).limit(max_messages).to_list(length=max_messages)
+            # Récupérer les derniers messages de la conversation et leurs bornes temporelles en une agrégation
+            result = await self.db.conversation_memory.aggregate([
+                {'$match': {'user_id': user_id, 'conversation_id': conversation_id}},
+                {'$sort': {'timestamp': -1}},
+                {'$limit': max_messages},
+                {'$facet': {
+                    'docs': [
+                        {'$sort': {'timestamp': 1}},
+                        {'$project': {'_id': 0, 'id': 1, 'user_message': 1, 'ai_response': 1, 'timestamp': 1}}
+                    ],
+                    'span': [
+                        {'$group': {'_id': None, 'start': {'$min': '$timestamp'}, 'end': {'$max': '$timestamp'}, 'count': {'$sum': 1}}}
+                    ]
+                }}
+            ]).to_list(length=1)
+            memories = result[0]['docs'] if result else []
             
             if not memories:
                 return {'summary': 'Aucun historique disponible', 'key_points': []}
+            span = result[0]['span'][0]
+            
+            # Résumé déjà calculé pour ce dernier message : rien de nouveau à résumer
+            summary_key = f"{conversation_id}:{memories[-1]['id']}"
+            cached = await self.db.conversation_summaries.find_one(
+                {'_id': summary_key, 'user_id': user_id},
+                projection={'summary_data': 1}
+            )
+            if cached:
+                return cached['summary_data']
+            
+            # Dernier résumé connu : seuls les échanges postérieurs sont envoyés au modèle
+            previous = await self.db.conversation_summaries.find_one(
+                {'user_id': user_id, 'conversation_id': conversation_id},
+                projection={'summary_data': 1, 'last_timestamp': 1},
+                sort=[('last_timestamp', -1)]
+            )
+            if previous:
+                new_memories = [memory for memory in memories if memory['timestamp'] > previous['last_timestamp']]
+                if not new_memories:
+                    return previous['summary_data']
+            else:
+                new_memories = memories
             
             # Construire le contexte pour l'IA
             conversation_text = []
-            for memory in memories:
+            for memory in new_memories:
                 conversation_text.append(f"Utilisateur: {memory['user_message']}")
                 conversation_text.append(f"Assistant: {memory['ai_response']}")
             
             context = "\n".join(conversation_text[-20:])  # Derniers 20 échanges
             
-            # Générer le résumé via IA
-            summary_prompt = f"""Analyse cette conversation et génère un résumé structuré :
-
-{context}
-
-Instructions :
-1. Résume les points clés de la conversation
-2. Identifie les objectifs ou intentions de l'utilisateur
-3. Note les progrès ou difficultés mentionnés
-4. Liste les décisions ou engagements pris
-
-Réponds en JSON :
-{{
-    "summary": "résumé en 2-3 phrases",
-    "key_points": ["point1", "point2", "point3"],
-    "user_objectives": ["objectif1", "objectif2"],
-    "commitments": ["engagement1", "engagement2"],
-    "next_actions": ["action1", "action2"]
-}}"""
-
-            response = self.openai_client.chat.completions.create(
+            if previous:
+                previous_summary = {
+                    field: previous['summary_data'].get(field)
+                    for field in ('summary', 'key_points', 'user_objectives', 'commitments', 'next_actions')
+                    if previous['summary_data'].get(field)
+                }
+                user_content = (
+                    f"Résumé précédent :\n{json.dumps(previous_summary, ensure_ascii=False)}\n\n"
+                    f"Nouveaux échanges :\n\n{context}\n\n"
+                    "Mets à jour le résumé en intégrant ces nouveaux échanges."
+                )
+            else:
+                user_content = f"Conversation :\n\n{context}"
+            
+            # Générer le résumé via IA (appel asynchrone, sortie JSON garantie)
+            response = await self.openai_client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": summary_prompt}],
+                messages=[
+                    {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                    {"role": "user", "content": user_content}
+                ],
                 temperature=0.3,
-                max_tokens=400
+                max_tokens=400,
+                response_format={"type": "json_object"}
             )
             
             try:
@@ -168,13 +494,15 @@ Réponds en JSON :
                 
                 # Enrichir avec metadata
                 summary_data['message_count'] = len(memories)
-                summary_data['time_span'] = self._calculate_time_span(memories)
+                summary_data['time_span'] = self._calculate_time_span(span['start'], span['end'], span['count'])
                 summary_data['generated_at'] = datetime.utcnow()
                 
+                await self._cache_conversation_summary(summary_key, user_id, conversation_id, memories[-1], summary_data)
+                
                 return summary_data
                 
             except json.JSONDecodeError:
-                # Fallback si JSON invalide
+                # Fallback si JSON tronqué (max_tokens atteint)
                 return {
                     'summary': response.choices[0].message.content.strip(),
                     'key_points': [],
@@ -185,24 +513,38 @@ Réponds en JSON :
             logger.error(f"Erreur génération résumé: {e}")
             return {'summary': 'Erreur génération résumé', 'key_points': []}
     
+    async def _cache_conversation_summary(self,
+                                          summary_key: str,
+                                          user_id: str,
+                                          conversation_id: str,
+                                          last_memory: Dict[str, Any],
+                                          summary_data: Dict[str, Any]):
+        """Enregistre le résumé d'une conversation jusqu'à un message donné"""
+        try:
+            await self.db.conversation_summaries.replace_one(
+                {'_id': summary_key},
+                {
+                    'user_id': user_id,
+                    'conversation_id': conversation_id,
+                    'last_memory_id': last_memory['id'],
+                    'last_timestamp': last_memory['timestamp'],
+                    'summary_data': summary_data
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Erreur mise en cache résumé {summary_key}: {e}")
+    
     async def update_user_profile_from_memory(self, user_id: str) -> Dict[str, Any]:
         """Met à jour le profil utilisateur basé sur l'analyse de la mémoire"""
         try:
-            # Récupérer les mémoires récentes (30 derniers jours)
+            # Analyser les mémoires récentes (30 derniers jours) côté MongoDB
             cutoff_date = datetime.utcnow() - timedelta(days=30)
-            recent_memories = await self.db.conversation_memory.find(
-                {
-                    'user_id': user_id,
-                    'timestamp': {'$gte': cutoff_date}
-                }
-            ).sort('timestamp', -1).limit(100).to_list(length=100)
+            analysis = await self._analyze_memory_patterns(user_id, cutoff_date)
             
-            if not recent_memories:
+            if not analysis.get('activity_timing', {}).get('total_interactions'):
                 return {'updated': False, 'reason': 'no_recent_memories'}
             
-            # Analyser les patterns
-            analysis = await self._analyze_memory_patterns(recent_memories)
-            
             # Mettre à jour le profil comportemental
             behavior_update = {
                 'communication_patterns': analysis['communication_style'],
@@ -222,50 +564,105 @@ Réponds en JSON :
                 },
                 upsert=True
             )
+            RequestCtx.invalidate(user_id)
             
             return {
                 'updated': True,
                 'analysis_summary': analysis,
-                'memories_analyzed': len(recent_memories)
+                'memories_analyzed': analysis['activity_timing']['total_interactions']
             }
             
         except Exception as e:
             logger.error(f"Erreur mise à jour profil mémoire: {e}")
             return {'updated': False, 'error': str(e)}
     
-    async def _analyze_memory_patterns(self, memories: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyse les patterns dans les mémoires conversationnelles"""
+    async def _analyze_memory_patterns(self,
+                                       user_id: str,
+                                       cutoff_date: datetime,
+                                       max_memories: int = 100) -> Dict[str, Any]:
+        """Analyse les patterns des mémoires récentes en une seule agrégation (seuls les top-K reviennent)"""
         try:
-            # Extraire les topics fréquents
-            all_topics = []
-            all_emotions = []
-            response_lengths = []
-            time_patterns = []
-            
-            for memory in memories:
-                all_topics.extend(memory.get('topics_mentioned', []))
-                all_emotions.extend(memory.get('emotions_detected', []))
-                response_lengths.append(len(memory.get('ai_response', '')))
-                time_patterns.append(memory['timestamp'].hour)
-            
-            # Analyser les patterns
-            frequent_topics = self._get_frequent_items(all_topics, min_count=3)
-            dominant_emotions = self._get_frequent_items(all_emotions, min_count=2)
-            avg_response_length = np.mean(response_lengths) if response_lengths else 0
-            most_active_hours = self._get_frequent_items(time_patterns, min_count=2)
+            user_message = {'$ifNull': ['$user_message', '']}
+            ai_response = {'$ifNull': ['$ai_response', '']}
+            
+            pipeline = [
+                {'$match': {'user_id': user_id, 'timestamp': {'$gte': cutoff_date}}},
+                {'$sort': {'timestamp': -1}},
+                {'$limit': max_memories},
+                {'$facet': {
+                    'topics': [
+                        {'$unwind': '$topics_mentioned'},
+                        {'$sortByCount': '$topics_mentioned'},
+                        {'$limit': 10}
+                    ],
+                    'emotions': [
+                        {'$unwind': '$emotions_detected'},
+                        {'$sortByCount': '$emotions_detected'},
+                        {'$limit': 10}
+                    ],
+                    'hours': [
+                        {'$sortByCount': {'$hour': '$timestamp'}},
+                        {'$limit': 10}
+                    ],
+                    'stats': [
+                        {'$group': {
+                            '_id': None,
+                            'total': {'$sum': 1},
+                            'avg_response_length': {'$avg': {'$strLenCP': ai_response}}
+                        }}
+                    ],
+                    # Évolution des objectifs : échanges mentionnant un objectif
+                    'goal_mentions': [
+                        {'$project': {'_id': 0, 'text': {'$concat': [user_message, ' ', ai_response]}}},
+                        {'$match': {'$expr': {'$regexMatch': {'input': {'$toLower': '$text'}, 'regex': _GOAL_PATTERN}}}},
+                        {'$project': {'mention': {'$substrCP': ['$text', 0, 100]}}}  # Premier 100 caractères
+                    ],
+                    # Préférences : longueur des réponses appréciées / critiquées
+                    'feedback': [
+                        {'$project': {
+                            'length': {'$strLenCP': ai_response},
+                            'kind': {'$switch': {
+                                'branches': [
+                                    {'case': {'$regexMatch': {'input': {'$toLower': user_message}, 'regex': _POSITIVE_PATTERN}},
+                                     'then': 'positive'},
+                                    {'case': {'$regexMatch': {'input': {'$toLower': user_message}, 'regex': _NEGATIVE_PATTERN}},
+                                     'then': 'negative'}
+                                ],
+                                'default': None
+                            }}
+                        }},
+                        {'$match': {'kind': {'$ne': None}}},
+                        {'$group': {'_id': '$kind', 'avg_length': {'$avg': '$length'}}}
+                    ]
+                }}
+            ]
+            
+            result = (await self.db.conversation_memory.aggregate(pipeline).to_list(length=1))[0]
+            
+            stats = result['stats'][0] if result['stats'] else {'total': 0, 'avg_response_length': 0}
+            frequent_topics = self._get_frequent_items(result['topics'], min_count=3)
+            dominant_emotions = self._get_frequent_items(result['emotions'], min_count=2)
+            most_active_hours = self._get_frequent_items(result['hours'], min_count=2)
+            feedback = {row['_id']: row['avg_length'] for row in result['feedback']}
+            
+            preferences = {}
+            if 'positive' in feedback:
+                preferences['preferred_response_length'] = feedback['positive']
+            if 'negative' in feedback:
+                preferences['disliked_response_length'] = feedback['negative']
             
             return {
                 'frequent_topics': frequent_topics,
                 'dominant_emotions': dominant_emotions,
                 'communication_style': {
-                    'prefers_detailed_responses': avg_response_length > 200,
+                    'prefers_detailed_responses': (stats['avg_response_length'] or 0) > 200,
                     'most_active_hours': most_active_hours
                 },
-                'goal_changes': await self._detect_goal_evolution(memories),
-                'preferred_responses': self._analyze_response_preferences(memories),
+                'goal_changes': [row['mention'] for row in result['goal_mentions']][-5:],  # Dernières 5 mentions
+                'preferred_responses': preferences,
                 'activity_timing': {
                     'most_active_hours': most_active_hours,
-                    'total_interactions': len(memories)
+                    'total_interactions': stats['total']
                 }
             }
             
@@ -273,141 +670,50 @@ Réponds en JSON :
             logger.error(f"Erreur analyse patterns: {e}")
             return {}
     
-    def _get_frequent_items(self, items: List[Any], min_count: int = 2) -> List[Tuple[Any, int]]:
-        """Récupère les éléments les plus fréquents"""
+    def _get_frequent_items(self, counts: List[Dict[str, Any]], min_count: int = 2) -> List[Tuple[Any, int]]:
+        """Récupère les éléments les plus fréquents (résultats de $sortByCount)"""
         try:
-            from collections import Counter
-            counter = Counter(items)
-            return [(item, count) for item, count in counter.most_common(10) if count >= min_count]
+            return [(row['_id'], row['count']) for row in counts if row['count'] >= min_count]
         except Exception:
             return []
     
-    async def _detect_goal_evolution(self, memories: List[Dict[str, Any]]) -> List[str]:
-        """Détecte l'évolution des objectifs dans les mémoires"""
-        try:
-            # Simple détection par mots-clés pour maintenant
-            goal_keywords = ['objectif', 'goal', 'veux', 'souhaite', 'planifie', 'projet']
-            goal_mentions = []
-            
-            for memory in memories:
-                text = f"{memory.get('user_message', '')} {memory.get('ai_response', '')}"
-                if any(keyword in text.lower() for keyword in goal_keywords):
-                    goal_mentions.append(text[:100])  # Premier 100 caractères
-            
-            return goal_mentions[-5:]  # Dernières 5 mentions
-            
-        except Exception as e:
-            logger.error(f"Erreur détection évolution objectifs: {e}")
-            return []
-    
-    def _analyze_response_preferences(self, memories: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyse les préférences de réponse de l'utilisateur"""
-        try:
-            # Analyser la longueur des réponses appréciées
-            positive_indicators = ['merci', 'parfait', 'excellent', 'super', 'génial']
-            negative_indicators = ['trop long', 'compliqué', 'pas clair']
-            
-            positive_response_lengths = []
-            negative_response_lengths = []
-            
-            for memory in memories:
-                user_message = memory.get('user_message', '').lower()
-                response_length = len(memory.get('ai_response', ''))
-                
-                if any(indicator in user_message for indicator in positive_indicators):
-                    positive_response_lengths.append(response_length)
-                elif any(indicator in user_message for indicator in negative_indicators):
-                    negative_response_lengths.append(response_length)
-            
-            preferences = {}
-            if positive_response_lengths:
-                preferences['preferred_response_length'] = np.mean(positive_response_lengths)
-            if negative_response_lengths:
-                preferences['disliked_response_length'] = np.mean(negative_response_lengths)
-            
-            return preferences
-            
-        except Exception as e:
-            logger.error(f"Erreur analyse préférences: {e}")
-            return {}
+    def _scan_text(self, message: str, combined_text: str) -> Dict[str, Any]:
+        """Un seul passage sur « message réponse » : topics et importance sur l'échange, émotions sur le message"""
+        matches, message_matches = self.keyword_matcher.scan_split(combined_text, len(message))
+        emotions = [emotion for emotion in EMOTION_KEYWORDS if ('emotion', emotion) in message_matches]
+        
+        return {
+            'topics': [topic for topic in TOPIC_KEYWORDS if ('topic', topic) in matches],
+            'emotions': emotions or ['neutre'],
+            'importance_hits': len(matches.get('importance', ())),
+            'length': len(combined_text)
+        }
     
-    def _calculate_importance_score(self, message: str, response: str) -> float:
+    def _calculate_importance_score(self,
+                                    message: str,
+                                    response: str,
+                                    scan: Optional[Dict[str, Any]] = None) -> float:
         """Calcule un score d'importance pour une interaction"""
         try:
-            importance_keywords = [
-                'important', 'urgent', 'objectif', 'goal', 'décision', 'problème',
-                'solution', 'projet', 'plan', 'échéance', 'deadline'
-            ]
-            
-            combined_text = f"{message} {response}".lower()
-            keyword_matches = sum(1 for keyword in importance_keywords if keyword in combined_text)
+            if scan is None:
+                combined_text = f"{message} {response}"
+                scan = self._scan_text(message, combined_text)
             
             # Score basé sur les mots-clés et la longueur
-            base_score = min(keyword_matches * 0.2, 0.8)
-            length_bonus = min(len(combined_text) / 1000, 0.2)  # Bonus pour les interactions longues
+            base_score = min(scan['importance_hits'] * 0.2, 0.8)
+            length_bonus = min(scan['length'] / 1000, 0.2)  # Bonus pour les interactions longues
             
             return min(base_score + length_bonus, 1.0)
             
         except Exception:
             return 0.5  # Score par défaut
     
-    async def _extract_topics(self, text: str) -> List[str]:
-        """Extrait les topics/sujets principaux d'un texte"""
-        try:
-            # Topics basiques par mots-clés (peut être enrichi avec NLP avancé)
-            topic_keywords = {
-                'business': ['business', 'entreprise', 'startup', 'marketing', 'vente'],
-                'développement_personnel': ['développement', 'croissance', 'habitude', 'mindset'],
-                'santé': ['santé', 'sport', 'nutrition', 'fitness', 'bien-être'],
-                'éducation': ['apprendre', 'étudier', 'formation', 'compétence', 'cours'],
-                'technologie': ['tech', 'programmation', 'code', 'développement', 'app'],
-                'créativité': ['créatif', 'art', 'design', 'écriture', 'musique'],
-                'finances': ['argent', 'budget', 'investissement', 'épargne', 'finance']
-            }
-            
-            detected_topics = []
-            text_lower = text.lower()
-            
-            for topic, keywords in topic_keywords.items():
-                if any(keyword in text_lower for keyword in keywords):
-                    detected_topics.append(topic)
-            
-            return detected_topics
-            
-        except Exception:
-            return []
-    
-    def _detect_emotions(self, text: str) -> List[str]:
-        """Détecte les émotions dans un message (basique)"""
-        try:
-            emotion_keywords = {
-                'positif': ['heureux', 'content', 'motivé', 'enthousiaste', 'super', 'génial'],
-                'négatif': ['triste', 'déçu', 'frustré', 'difficile', 'problème', 'inquiet'],
-                'neutre': ['normal', 'ok', 'bien', 'standard'],
-                'déterminé': ['déterminé', 'motivé', 'prêt', 'go', 'action', 'objectif']
-            }
-            
-            detected_emotions = []
-            text_lower = text.lower()
-            
-            for emotion, keywords in emotion_keywords.items():
-                if any(keyword in text_lower for keyword in keywords):
-                    detected_emotions.append(emotion)
-            
-            return detected_emotions if detected_emotions else ['neutre']
-            
-        except Exception:
-            return ['neutre']
-    
-    def _calculate_time_span(self, memories: List[Dict[str, Any]]) -> str:
-        """Calcule la durée d'une conversation"""
+    def _calculate_time_span(self, start_time: datetime, end_time: datetime, message_count: int) -> str:
+        """Calcule la durée d'une conversation à partir de ses bornes"""
         try:
-            if len(memories) < 2:
+            if message_count < 2:
                 return "conversation unique"
             
-            start_time = min(memory['timestamp'] for memory in memories)
-            end_time = max(memory['timestamp'] for memory in memories)
-            
             duration = end_time - start_time
             
             if duration.days > 0:
@@ -420,21 +726,108 @@ Réponds en JSON :
         except Exception:
             return "durée inconnue"
     
-    async def _trigger_memory_synthesis(self, user_id: str):
-        """Déclenche la synthèse mémoire si nécessaire"""
+    def start_synthesis_sweeper(self, interval_seconds: float = 300):
+        """Lance le balayage périodique des synthèses de profil (au démarrage)"""
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._synthesis_sweeper_loop(interval_seconds))
+    
+    async def stop_synthesis_sweeper(self):
+        """Arrête le balayage périodique (à l'arrêt)"""
+        if self._sweeper_task is None:
+            return
+        self._sweeper_task.cancel()
         try:
-            # Vérifier si une synthèse est nécessaire (tous les 50 messages par exemple)
-            message_count = await self.db.conversation_memory.count_documents(
-                {'user_id': user_id}
+            await self._sweeper_task
+        except asyncio.CancelledError:
+            pass
+        self._sweeper_task = None
+    
+    async def _synthesis_sweeper_loop(self, interval_seconds: float):
+        """Boucle du balayage : une erreur ne doit pas arrêter les passages suivants"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.run_synthesis_sweep()
+            except Exception as e:
+                logger.error(f"Erreur balayage synthèse mémoire: {e}")
+    
+    async def run_synthesis_sweep(self, max_users: int = 100) -> int:
+        """Synthétise les profils éligibles : nouveaux souvenirs et (1h écoulée ou synthesis_every nouveaux souvenirs)
+
+        Chaque utilisateur est réservé atomiquement avant l'analyse : avec plusieurs workers, un seul l'analyse.
+        """
+        try:
+            now = datetime.utcnow()
+            cutoff = now - self.synthesis_min_interval
+            new_memories = {'$subtract': ['$memory_count', {'$ifNull': ['$last_analysis_count', 0]}]}
+            eligibility = {
+                'memory_count': {'$gt': 0},
+                # Non réservé, ou réservation expirée (champ absent : inférieur à toute date)
+                '$or': [
+                    {'analysis_claimed_at': None},
+                    {'analysis_claimed_at': {'$lte': now - self.synthesis_claim_timeout}}
+                ],
+                '$expr': {'$and': [
+                    {'$gt': [new_memories, 0]},
+                    {'$or': [
+                        {'$gte': [new_memories, self.synthesis_every]},
+                        # Champ absent (jamais analysé) : inférieur à toute date
+                        {'$lte': ['$last_analysis_at', cutoff]}
+                    ]}
+                ]}
+            }
+            
+            candidates = await self.db.memory_synthesis_state.find(
+                eligibility, projection={'_id': 0, 'user_id': 1}
+            ).limit(max_users).to_list(length=max_users)
+            
+            if not candidates:
+                return 0
+            
+            semaphore = asyncio.Semaphore(self.synthesis_concurrency)
+            
+            async def analyze(user_id: str) -> bool:
+                async with semaphore:
+                    # Réservation conditionnée à l'éligibilité : échoue si un autre worker l'a prise ou traitée
+                    state = await self.db.memory_synthesis_state.find_one_and_update(
+                        {**eligibility, 'user_id': user_id},
+                        {'$set': {'analysis_claimed_at': datetime.utcnow()}},
+                        projection={'_id': 0, 'memory_count': 1},
+                        return_document=ReturnDocument.AFTER
+                    )
+                    if state is None:
+                        return False
+                    await self._safe_profile_update(user_id, state['memory_count'])
+                    return True
+            
+            results = await asyncio.gather(
+                *[analyze(candidate['user_id']) for candidate in candidates], return_exceptions=True
             )
+            analyzed = sum(1 for result in results if result is True)
+            logger.info(f"Synthèse mémoire effectuée pour {analyzed} utilisateurs")
+            return analyzed
             
-            if message_count > 0 and message_count % 50 == 0:
-                # Déclencher la mise à jour du profil
-                await self.update_user_profile_from_memory(user_id)
-                logger.info(f"Synthèse mémoire déclenchée pour {user_id} à {message_count} messages")
-                
         except Exception as e:
-            logger.error(f"Erreur déclenchement synthèse: {e}")
+            logger.error(f"Erreur sélection des synthèses mémoire: {e}")
+            return 0
+    
+    async def _safe_profile_update(self, user_id: str, memory_count: int):
+        """Met à jour le profil depuis la mémoire et enregistre le point d'analyse, en journalisant les échecs"""
+        try:
+            result = await self.update_user_profile_from_memory(user_id)
+            if not result.get('updated'):
+                logger.warning(f"Synthèse mémoire sans mise à jour pour {user_id}: {result.get('reason') or result.get('error')}")
+            
+            # Point d'analyse enregistré même sans mise à jour (évite de réessayer à chaque balayage)
+            await self.db.memory_synthesis_state.update_one(
+                {'user_id': user_id},
+                {
+                    '$set': {'last_analysis_count': memory_count, 'last_analysis_at': datetime.utcnow()},
+                    '$unset': {'analysis_claimed_at': ''}
+                }
+            )
+        except Exception as e:
+            logger.error(f"Erreur synthèse mémoire en tâche de fond pour {user_id}: {e}")
     
     async def get_memory_analytics(self, user_id: Optional[str] = None, days: int = 30) -> Dict[str, Any]:
         """Récupère les analytics du système de mémoire"""
@@ -490,6 +883,9 @@ Réponds en JSON :
                 }
             )
             
+            if self.vector_index is not None and result.deleted_count:
+                self.vector_index.clear()
+            
             logger.info(f"Nettoyage mémoire: {result.deleted_count} entrées supprimées")
             return result.deleted_count
             
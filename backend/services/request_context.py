@@ -0,0 +1,71 @@
+"""
+🧾 Contexte de requête partagé entre services
+Profil utilisateur, onboarding et profil comportemental lus une seule fois par tour de chat
+"""
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+import asyncio
+import time
+import logging
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+# Contextes récemment chargés : user_id -> (instant de chargement, contexte), partagés par les services
+_ctx_cache: "OrderedDict[str, Tuple[float, RequestCtx]]" = OrderedDict()
+CTX_CACHE_TTL_SECONDS = 300
+CTX_CACHE_MAX_ENTRIES = 10000
+
+@dataclass
+class RequestCtx:
+    """Documents utilisateur communs au prompt et à l'extraction de tâches"""
+    user_id: str
+    user: Optional[Dict[str, Any]] = None
+    onboarding: Optional[Dict[str, Any]] = None
+    behavior: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    async def load(cls, db: AsyncIOMotorDatabase, user_id: str) -> Optional["RequestCtx"]:
+        """Récupère les trois documents en un seul aller-retour (None en cas d'échec : chaque service relira lui-même)"""
+        cached = cls.cached(user_id)
+        if cached is not None:
+            return cached
+        
+        try:
+            user, onboarding, behavior = await asyncio.gather(
+                db.users.find_one({'id': user_id}),
+                db.onboarding_profiles.find_one({'user_id': user_id}),
+                db.user_behavior_profiles.find_one({'user_id': user_id})
+            )
+            return cls.remember(cls(user_id=user_id, user=user, onboarding=onboarding, behavior=behavior))
+
+        except Exception as e:
+            logger.error(f"Erreur chargement contexte de requête {user_id}: {e}")
+            return None
+
+    @classmethod
+    def cached(cls, user_id: str) -> Optional["RequestCtx"]:
+        """Contexte chargé il y a moins de CTX_CACHE_TTL_SECONDS (None sinon)"""
+        entry = _ctx_cache.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > CTX_CACHE_TTL_SECONDS:
+            del _ctx_cache[user_id]
+            return None
+        _ctx_cache.move_to_end(user_id)
+        return entry[1]
+
+    @classmethod
+    def remember(cls, ctx: "RequestCtx") -> "RequestCtx":
+        """Met en cache un contexte fraîchement lu (éviction LRU)"""
+        _ctx_cache[ctx.user_id] = (time.monotonic(), ctx)
+        _ctx_cache.move_to_end(ctx.user_id)
+        while len(_ctx_cache) > CTX_CACHE_MAX_ENTRIES:
+            _ctx_cache.popitem(last=False)
+        return ctx
+
+    @classmethod
+    def invalidate(cls, user_id: str):
+        """Oublie le contexte d'un utilisateur (à appeler après toute écriture de ses profils)"""
+        _ctx_cache.pop(user_id, None)
@@ -0,0 +1,99 @@
+"""
+💾 Cache sémantique des réponses IA
+Évite un appel LLM complet quand un utilisateur repose une question déjà traitée récemment
+"""
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import bisect
+import time
+import logging
+import numpy as np
+from .similarity import topk_cosine
+
+logger = logging.getLogger(__name__)
+
+class SemanticResponseCache:
+    """Cache des réponses IA par utilisateur, indexé par similarité cosinus des messages
+
+    Les embeddings sont fournis déjà normalisés par l'appelant (EmbeddingBatcher).
+    """
+
+    def __init__(self,
+                 similarity_threshold: float = 0.92,
+                 max_entries_per_user: int = 200,
+                 max_users: int = 10000,
+                 ttl_seconds: int = 3600):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        # user_id -> {'matrix': float32[N, D], 'responses': [réponse], 'created_at': [float]}
+        self._user_caches: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def lookup(self, user_id: str, query_embedding: np.ndarray) -> Optional[Any]:
+        """Retourne la réponse en cache la plus proche si elle dépasse le seuil de similarité"""
+        try:
+            entry = self._user_caches.get(user_id)
+            if not entry:
+                return None
+
+            self._purge_expired(entry, time.monotonic())
+            if not entry['responses']:
+                del self._user_caches[user_id]
+                return None
+
+            # Embeddings normalisés : le produit scalaire est la similarité cosinus
+            top, scores = topk_cosine(entry['matrix'], query_embedding, 1)
+
+            if not len(top) or scores[0] < self.similarity_threshold:
+                return None
+
+            self._user_caches.move_to_end(user_id)
+            logger.info(f"Cache sémantique: réponse réutilisée pour {user_id} (score {scores[0]:.3f})")
+            return entry['responses'][int(top[0])]
+
+        except Exception as e:
+            logger.warning(f"Erreur lecture cache sémantique: {e}")
+            return None
+
+    def store(self, user_id: str, query_embedding: np.ndarray, response: Any):
+        """Ajoute une réponse au cache de l'utilisateur (éviction LRU + TTL)"""
+        try:
+            row = query_embedding.reshape(1, -1).astype(np.float32)
+            entry = self._user_caches.get(user_id)
+
+            if entry is None:
+                entry = {'matrix': row, 'responses': [response], 'created_at': [time.monotonic()]}
+                self._user_caches[user_id] = entry
+            else:
+                entry['matrix'] = np.vstack([entry['matrix'], row])
+                entry['responses'].append(response)
+                entry['created_at'].append(time.monotonic())
+
+                # Éviction des entrées les plus anciennes au-delà de la capacité
+                overflow = len(entry['responses']) - self.max_entries_per_user
+                if overflow > 0:
+                    self._drop_oldest(entry, overflow)
+
+            self._user_caches.move_to_end(user_id)
+            while len(self._user_caches) > self.max_users:
+                self._user_caches.popitem(last=False)
+
+        except Exception as e:
+            logger.warning(f"Erreur écriture cache sémantique: {e}")
+
+    def invalidate(self, user_id: str):
+        """Vide le cache d'un utilisateur"""
+        self._user_caches.pop(user_id, None)
+
+    def _purge_expired(self, entry: Dict[str, Any], now: float):
+        """Supprime les entrées expirées (insérées dans l'ordre chronologique)"""
+        expired = bisect.bisect_left(entry['created_at'], now - self.ttl_seconds)
+        if expired:
+            self._drop_oldest(entry, expired)
+
+    def _drop_oldest(self, entry: Dict[str, Any], count: int):
+        """Retire les `count` plus anciennes entrées"""
+        entry['matrix'] = entry['matrix'][count:]
+        entry['responses'] = entry['responses'][count:]
+        entry['created_at'] = entry['created_at'][count:]
@@ -0,0 +1,40 @@
+"""
+📐 Noyaux de similarité vectorielle et lexicale
+Fonctions partagées par l'index mémoire, le cache sémantique et l'extracteur de tâches
+"""
+from typing import Optional, Tuple
+import numpy as np
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normalise chaque ligne (L2) en float32 contigu pour que le produit scalaire soit la similarité cosinus"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def topk_cosine(matrix: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Retourne (indices, scores) des k lignes les plus similaires, triés par score décroissant
+
+    `matrix` doit être normalisée (normalize_rows) et `query` un vecteur normalisé.
+    """
+    if matrix.shape[0] == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    # Un seul produit matrice-vecteur (BLAS) puis sélection partielle O(N)
+    scores = matrix @ query
+    k = min(k, scores.shape[0])
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+
+    return top, scores[top]
+
+def token_set(*texts: Optional[str]) -> frozenset:
+    """Ensemble des mots (minuscules) des textes, à calculer une fois par texte comparé"""
+    return frozenset(word for text in texts if text for word in text.lower().split())
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    """Similarité de Jaccard de deux ensembles de mots (0 si l'un est vide)"""
+    if not a or not b:
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
@@ -2,71 +2,253 @@
 ✅ Extracteur de tâches intelligent - CORRECTION CRITIQUE #3
 Corrige l'extraction automatique des tâches depuis les conversations
 """
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from types import MappingProxyType
+from dataclasses import dataclass, fields
+from collections import OrderedDict, defaultdict
 import json
 import re
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import time
 import logging
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
 from motor.motor_asyncio import AsyncIOMotorDatabase
-import openai
-from openai import OpenAI
+from pymongo import WriteConcern, UpdateOne
+from openai import AsyncOpenAI
+from .request_context import RequestCtx
+from .embedding_batcher import EmbeddingBatcher
+from .response_cache import SemanticResponseCache
+from .keyword_matcher import KeywordMatcher
+from .similarity import token_set, jaccard, normalize_rows
+
+try:
+    import orjson  # Optionnel : décodage JSON en Rust
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    from rapidfuzz import fuzz, process, utils as fuzz_utils  # Optionnel : comparaison floue en C++
+except ImportError:
+    fuzz = process = fuzz_utils = None
 
 logger = logging.getLogger(__name__)
 
+# Motifs compilés une seule fois à l'import
+_SENT_SPLIT = re.compile(r'[.!?]')
+_STRIP_PREFIX = re.compile(r'^(je vais|je dois|il faut|je veux)\s*')
+
+# Vocabulaire de détection en lecture seule
+ACTION_VERBS = frozenset([
+    'faire', 'créer', 'développer', 'apprendre', 'étudier', 'lire', 'écrire',
+    'planifier', 'organiser', 'préparer', 'rechercher', 'analyser', 'contacter',
+    'appeler', 'envoyer', 'acheter', 'vendre', 'terminer', 'finir', 'commencer',
+    'démarrer', 'installer', 'configurer', 'tester', 'vérifier', 'réviser'
+])
+# Priorités par ordre de préséance (la plus haute l'emporte)
+PRIORITY_INDICATORS = MappingProxyType({
+    'haute': frozenset(['urgent', 'important', 'priorité', 'critique', 'immédiat', 'crucial']),
+    'moyenne': frozenset(['normal', 'standard', 'moyen', 'régulier']),
+    'basse': frozenset(['quand possible', 'si temps', 'optionnel', 'bonus', 'plus tard'])
+})
+# Échéances relatives en jours, par ordre de préséance
+RELATIVE_DAYS = MappingProxyType({
+    'aujourd\'hui': 0, 'demain': 1, 'cette semaine': 3, 'la semaine prochaine': 7, 'ce mois': 15
+})
+_DAYS_MAP = MappingProxyType({
+    'lundi': 0, 'mardi': 1, 'mercredi': 2, 'jeudi': 3,
+    'vendredi': 4, 'samedi': 5, 'dimanche': 6
+})
+
+# Schéma strict de la réponse d'extraction IA (sorties structurées OpenAI)
+TASK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'tasks': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'description': {'type': 'string'},
+                    'priority': {'type': 'string', 'enum': ['haute', 'moyenne', 'basse']},
+                    'estimated_date': {'type': ['string', 'null']},
+                    'confidence': {'type': 'number'}
+                },
+                'required': ['title', 'description', 'priority', 'estimated_date', 'confidence'],
+                'additionalProperties': False
+            }
+        }
+    },
+    'required': ['tasks'],
+    'additionalProperties': False
+}
+
+@dataclass(slots=True)
+class Task:
+    """Tâche en cours d'extraction (convertie en dict seulement pour le log et la réponse)"""
+    title: str
+    description: str = ''
+    priority: str = 'moyenne'
+    estimated_date: Optional[str] = None
+    confidence: float = 0.5
+    extraction_method: str = ''
+    related_goal_id: Optional[str] = None
+    related_goal_title: Optional[str] = None
+    category: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Task":
+        """Construit une tâche depuis un dict (clés inconnues ignorées)"""
+        return cls(**{name: data[name] for name in _TASK_FIELDS if data.get(name) is not None})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dict sérialisable ; les champs d'enrichissement absents sont omis"""
+        data = {name: getattr(self, name) for name in _TASK_FIELDS}
+        for name in _ENRICHMENT_FIELDS:
+            if data[name] is None:
+                del data[name]
+        return data
+
+_TASK_FIELDS = tuple(field.name for field in fields(Task))
+_ENRICHMENT_FIELDS = ('related_goal_id', 'related_goal_title', 'category')
+
+def _goal_text(goal: Dict[str, Any]) -> str:
+    """Texte d'un objectif utilisé pour son embedding"""
+    return f"{goal.get('title') or ''} {goal.get('description') or ''}".strip()
+
+def _text_hash(text: str) -> str:
+    """Empreinte courte d'un texte (détecte un embedding d'objectif périmé)"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def parse_deadline(estimated_date: Optional[str]) -> Optional[datetime]:
+    """Échéance d'une tâche extraite ('YYYY-MM-DD'), None si absente ou invalide (date fournie par le LLM)"""
+    if not estimated_date:
+        return None
+    try:
+        return datetime.strptime(estimated_date, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        logger.warning(f"Échéance extraite invalide ignorée: {estimated_date!r}")
+        return None
+
 class TaskExtractor:
     """Extracteur intelligent de tâches depuis les conversations"""
     
-    def __init__(self, db: AsyncIOMotorDatabase, openai_client: OpenAI):
+    def __init__(self,
+                 db: AsyncIOMotorDatabase,
+                 openai_client: AsyncOpenAI,
+                 max_concurrent_ai_calls: int = 32,
+                 embedding_batcher: Optional[EmbeddingBatcher] = None,
+                 cache_ttl_seconds: int = 3600,
+                 cache_max_entries: int = 5000,
+                 goal_similarity_threshold: float = 0.75,
+                 title_similarity_cutoff: float = 80,
+                 ai_model: str = "gpt-3.5-turbo",
+                 strict_schema: bool = False,
+                 rules_only_confidence: float = 0.8,
+                 rules_only_max_length: int = 30):
         self.db = db
         self.openai_client = openai_client
-        self.task_patterns = self._init_task_patterns()
-        
-    def _init_task_patterns(self) -> Dict[str, Any]:
-        """Initialise les patterns de détection de tâches"""
-        return {
-            'action_verbs': [
-                'faire', 'créer', 'développer', 'apprendre', 'étudier', 'lire', 'écrire',
-                'planifier', 'organiser', 'préparer', 'rechercher', 'analyser', 'contacter',
-                'appeler', 'envoyer', 'acheter', 'vendre', 'terminer', 'finir', 'commencer',
-                'démarrer', 'installer', 'configurer', 'tester', 'vérifier', 'réviser'
-            ],
-            'time_indicators': [
-                'aujourd\'hui', 'demain', 'cette semaine', 'la semaine prochaine',
-                'ce mois', 'le mois prochain', 'avant', 'après', 'dans', 'd\'ici',
-                'lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche'
-            ],
-            'priority_indicators': {
-                'haute': ['urgent', 'important', 'priorité', 'critique', 'immédiat', 'crucial'],
-                'moyenne': ['normal', 'standard', 'moyen', 'régulier'],
-                'basse': ['quand possible', 'si temps', 'optionnel', 'bonus', 'plus tard']
+        # Appels d'extraction IA simultanés bornés (protège les quotas OpenAI sous charge)
+        self._ai_semaphore = asyncio.Semaphore(max_concurrent_ai_calls)
+        # Cache des extractions IA : exact (mémoire puis MongoDB), puis sémantique si un batcher est fourni
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_entries = cache_max_entries
+        self._exact_cache: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._unacked_cache = db.task_extraction_cache.with_options(write_concern=WriteConcern(w=0))
+        self.embedding_batcher = embedding_batcher
+        self._semantic_cache = SemanticResponseCache(
+            similarity_threshold=0.95,
+            ttl_seconds=cache_ttl_seconds
+        ) if embedding_batcher is not None else None
+        # Réponse IA contrainte côté serveur : schéma strict (modèles compatibles, ex. gpt-4o-mini) ou mode JSON
+        self.ai_model = ai_model
+        if strict_schema:
+            self._ai_response_format = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'tasks', 'schema': TASK_SCHEMA, 'strict': True}
             }
-        }
+        else:
+            self._ai_response_format = {'type': 'json_object'}
+        # Appel IA évité si les règles suffisent (toutes les tâches assez sûres) ou si le message est trop court
+        self.rules_only_confidence = rules_only_confidence
+        self.rules_only_max_length = rules_only_max_length
+        # Doublons de titres : score token_set_ratio minimal (rapidfuzz, tolère les fautes de frappe)
+        self.title_similarity_cutoff = title_similarity_cutoff
+        # Association tâche -> objectif par similarité d'embeddings (Jaccard en repli)
+        self.goal_similarity_threshold = goal_similarity_threshold
+        self._unacked_goals = db.goals.with_options(write_concern=WriteConcern(w=0))
+        # Vectoriseurs TF-IDF des objectifs par utilisateur : user_id -> (signature des objectifs, vectoriseur, matrice)
+        self._goal_vectorizers: "OrderedDict[str, Tuple[Tuple, TfidfVectorizer, Any]]" = OrderedDict()
+        self.goal_vectorizers_max_users = 1000
+        # Logs d'extraction écrits par lots (hors du chemin de la requête)
+        self._log_buffer: List[Dict[str, Any]] = []
+        self._log_lock = asyncio.Lock()
+        self._last_log_flush = time.monotonic()
+        self.log_flush_size = 500
+        self.log_flush_interval = 2
+        self.log_buffer_max = 10000
+        self.analytics_max_time_ms = 5000
+        self._bg_tasks = set()
+        # Verbes, priorités et indices temporels dans un même automate (un passage par phrase, mots entiers)
+        self.keyword_matcher = KeywordMatcher({
+            'verb': ACTION_VERBS,
+            **{('priority', prio): indicators for prio, indicators in PRIORITY_INDICATORS.items()},
+            **{('relative', hint): [hint] for hint in RELATIVE_DAYS},
+            **{('day', day_num): [day_name] for day_name, day_num in _DAYS_MAP.items()}
+        }, whole_words=True)
+        
+    async def ensure_indexes(self):
+        """Crée les index de l'extracteur (au démarrage)"""
+        await self.db.task_extractions_log.create_index([('user_id', 1), ('timestamp', -1)], background=True)
+        # Agrégat journalier des analytics d'extraction
+        await self.db.task_extractions_daily.create_index([('date', 1), ('user_id', 1)], unique=True, background=True)
+        # Analytics d'un seul utilisateur sur une période
+        await self.db.task_extractions_daily.create_index([('user_id', 1), ('date', -1)], background=True)
+        # Expiration automatique des extractions mises en cache
+        await self.db.task_extraction_cache.create_index(
+            'created_at', expireAfterSeconds=self.cache_ttl_seconds, background=True
+        )
     
     async def extract_tasks_from_message(self, 
                                        message: str, 
                                        user_id: str,
                                        conversation_id: str,
-                                       conversation_context: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+                                       conversation_context: List[Dict[str, Any]] = None,
+                                       ctx: Optional[RequestCtx] = None) -> Dict[str, Any]:
         """Extrait les tâches d'un message utilisateur"""
         try:
+            # Horodatage unique de l'extraction (échéances, log et réponse)
+            now = datetime.utcnow()
+            
             # Méthode hybride : règles + IA
-            rule_based_tasks = self._extract_by_rules(message)
-            ai_based_tasks = await self._extract_by_ai(message, conversation_context or [])
+            rule_based_tasks = list(self._extract_by_rules(message, today=now))
+            if self._rules_suffice(message, rule_based_tasks):
+                ai_based_tasks = []
+                extraction_method = 'rules_only'
+            else:
+                ai_based_tasks = await self._extract_by_ai_cached(message, user_id, conversation_context or [])
+                extraction_method = 'hybrid'
             
             # Fusionner et déduplicater
             merged_tasks = self._merge_task_extractions(rule_based_tasks, ai_based_tasks)
             
             # Enrichir avec le contexte utilisateur
-            enriched_tasks = await self._enrich_tasks_with_context(merged_tasks, user_id)
+            enriched_tasks = await self._enrich_tasks_with_context(merged_tasks, user_id, ctx=ctx)
+            # Conversion en dicts une seule fois, pour le log et la réponse
+            enriched_tasks = [task.to_dict() for task in enriched_tasks]
             
             # Sauvegarder l'extraction pour analytics
-            await self._log_extraction(user_id, conversation_id, message, enriched_tasks)
+            await self._log_extraction(user_id, conversation_id, message, enriched_tasks, now=now)
             
             return {
                 'tasks_found': enriched_tasks,
-                'extraction_method': 'hybrid',
+                'extraction_method': extraction_method,
                 'confidence_score': self._calculate_confidence(enriched_tasks),
-                'processed_at': datetime.utcnow()
+                'processed_at': now
             }
             
         except Exception as e:
@@ -78,111 +260,202 @@ class TaskExtractor:
                 'error': str(e)
             }
     
-    def _extract_by_rules(self, message: str) -> List[Dict[str, Any]]:
-        """Extraction basée sur des règles linguistiques"""
-        tasks = []
-        
+    def _rules_suffice(self, message: str, rule_tasks: List[Task]) -> bool:
+        """Vrai si l'extraction IA n'apporterait rien : message très court, ou tâches par règles toutes assez sûres"""
+        if len(message) < self.rules_only_max_length:
+            return True
+        return bool(rule_tasks) and min(task.confidence for task in rule_tasks) >= self.rules_only_confidence
+    
+    async def extract_tasks_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Extrait les tâches de plusieurs messages en parallèle (arguments nommés de extract_tasks_from_message)"""
+        return await asyncio.gather(*[self.extract_tasks_from_message(**item) for item in items])
+    
+    def _extract_by_rules(self, message: str, today: Optional[datetime] = None) -> Iterator[Task]:
+        """Extraction basée sur des règles linguistiques (générateur : les phrases sont traitées à la demande)"""
         try:
-            # Nettoyer le message
-            message_clean = message.lower().strip()
-            sentences = re.split(r'[.!?]', message_clean)
+            today = today or datetime.now()
+            # Dates déjà formatées pour ce message (décalage en jours -> 'YYYY-MM-DD')
+            date_cache: Dict[int, str] = {}
             
-            for sentence in sentences:
+            # Nettoyer le message et le découper en phrases
+            for sentence in _SENT_SPLIT.split(message.lower().strip()):
                 sentence = sentence.strip()
                 if len(sentence) < 5:  # Ignorer les phrases trop courtes
                     continue
                 
-                # Détecter les verbes d'action
-                action_found = None
-                for verb in self.task_patterns['action_verbs']:
-                    if verb in sentence:
-                        action_found = verb
-                        break
+                # Un seul passage sur la phrase : verbes, priorités et indices temporels
+                categories = self._match_categories(sentence)
                 
+                # Phrase sans verbe d'action : ignorée avant tout parsing
+                action_found = categories.get('verb')
                 if not action_found:
                     continue
                 
                 # Extraire la tâche potentielle
-                task = self._parse_task_from_sentence(sentence, action_found)
+                task = self._parse_task_from_sentence(sentence, action_found, categories=categories,
+                                                      date_cache=date_cache, today=today)
                 if task:
-                    tasks.append(task)
-            
-            return tasks
+                    yield task
             
         except Exception as e:
             logger.error(f"Erreur extraction par règles: {e}")
-            return []
     
-    def _parse_task_from_sentence(self, sentence: str, action_verb: str) -> Optional[Dict[str, Any]]:
-        """Parse une tâche depuis une phrase"""
+    def _match_categories(self, sentence: str) -> Dict[Any, str]:
+        """Catégories présentes dans la phrase, chacune associée à son premier mot-clé rencontré"""
+        categories: Dict[Any, str] = {}
+        for _, keyword, cats in self.keyword_matcher.matches(sentence):
+            for category in cats:
+                categories.setdefault(category, keyword)
+        return categories
+    
+    def _parse_task_from_sentence(self,
+                                  sentence: str,
+                                  action_verb: str,
+                                  categories: Optional[Dict[Any, str]] = None,
+                                  date_cache: Optional[Dict[int, str]] = None,
+                                  today: Optional[datetime] = None) -> Optional[Task]:
+        """Parse une tâche depuis une phrase (categories : résultat de _match_categories s'il est déjà calculé)"""
         try:
             # Titre de la tâche (simplifiée)
             title = sentence.replace(action_verb, '').strip()
-            title = re.sub(r'^(je vais|je dois|il faut|je veux)', '', title).strip()
+            title = _STRIP_PREFIX.sub('', title).strip()
             
             if len(title) < 3:
                 return None
             
+            if categories is None:
+                categories = self._match_categories(sentence)
+            
             # Détecter la priorité
-            priority = 'moyenne'
-            for prio, indicators in self.task_patterns['priority_indicators'].items():
-                if any(indicator in sentence for indicator in indicators):
-                    priority = prio
-                    break
+            priority = next((prio for prio in PRIORITY_INDICATORS if ('priority', prio) in categories), 'moyenne')
             
             # Détecter les indicateurs temporels
-            estimated_date = self._extract_date_from_sentence(sentence)
+            estimated_date = self._extract_date_from_sentence(
+                sentence, categories=categories, date_cache=date_cache, today=today
+            )
             
-            return {
-                'title': title.capitalize(),
-                'description': sentence,
-                'priority': priority,
-                'estimated_date': estimated_date,
-                'extraction_method': 'rules',
-                'confidence': 0.7
-            }
+            return Task(
+                title=title.capitalize(),
+                description=sentence,
+                priority=priority,
+                estimated_date=estimated_date,
+                extraction_method='rules',
+                # Verbe d'action et échéance explicites : tâche assez sûre pour se passer de l'IA
+                confidence=0.8 if estimated_date else 0.7
+            )
             
         except Exception as e:
             logger.error(f"Erreur parsing tâche: {e}")
             return None
     
-    def _extract_date_from_sentence(self, sentence: str) -> Optional[str]:
-        """Extrait une date approximative depuis une phrase"""
+    def _extract_date_from_sentence(self,
+                                    sentence: str,
+                                    categories: Optional[Dict[Any, str]] = None,
+                                    date_cache: Optional[Dict[int, str]] = None,
+                                    today: Optional[datetime] = None) -> Optional[str]:
+        """Extrait une date approximative depuis une phrase (date_cache : dates déjà formatées pour ce message)"""
         try:
-            today = datetime.now()
+            today = today or datetime.now()
+            if categories is None:
+                categories = self._match_categories(sentence)
             
             # Patterns temporels simples
-            if 'aujourd\'hui' in sentence:
-                return today.strftime('%Y-%m-%d')
-            elif 'demain' in sentence:
-                return (today + timedelta(days=1)).strftime('%Y-%m-%d')
-            elif 'cette semaine' in sentence:
-                return (today + timedelta(days=3)).strftime('%Y-%m-%d')
-            elif 'la semaine prochaine' in sentence:
-                return (today + timedelta(days=7)).strftime('%Y-%m-%d')
-            elif 'ce mois' in sentence:
-                return (today + timedelta(days=15)).strftime('%Y-%m-%d')
-            
-            # Patterns de jours de la semaine
-            days_map = {
-                'lundi': 0, 'mardi': 1, 'mercredi': 2, 'jeudi': 3,
-                'vendredi': 4, 'samedi': 5, 'dimanche': 6
-            }
+            days_ahead = next(
+                (offset for hint, offset in RELATIVE_DAYS.items() if ('relative', hint) in categories), None
+            )
             
-            for day_name, day_num in days_map.items():
-                if day_name in sentence:
-                    days_ahead = day_num - today.weekday()
-                    if days_ahead <= 0:  # Le jour est déjà passé cette semaine
-                        days_ahead += 7
-                    return (today + timedelta(days=days_ahead)).strftime('%Y-%m-%d')
+            # Patterns de jours de la semaine (le premier de la semaine l'emporte)
+            if days_ahead is None:
+                day_num = next((num for num in range(7) if ('day', num) in categories), None)
+                if day_num is None:
+                    return None
+                # Prochaine occurrence du jour : dans 1 à 7 jours (jamais aujourd'hui)
+                days_ahead = (day_num - today.weekday()) % 7 or 7
             
-            return None
+            if date_cache is None:
+                date_cache = {}
+            if days_ahead not in date_cache:
+                date_cache[days_ahead] = (today + timedelta(days=days_ahead)).strftime('%Y-%m-%d')
+            return date_cache[days_ahead]
             
         except Exception as e:
             logger.error(f"Erreur extraction date: {e}")
             return None
     
-    async def _extract_by_ai(self, message: str, conversation_context: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def _extract_by_ai_cached(self,
+                                    message: str,
+                                    user_id: str,
+                                    conversation_context: List[Dict[str, Any]]) -> List[Task]:
+        """Extraction IA servie par le cache si le même message (ou un message quasi identique) a déjà été analysé"""
+        key = hashlib.blake2b(f"{user_id}\0{message.strip().lower()}".encode('utf-8'), digest_size=16).hexdigest()
+        
+        tasks = self._exact_cache_get(key)
+        if tasks is None:
+            tasks = await self._persisted_cache_get(key)
+            if tasks is not None:
+                self._exact_cache_put(key, tasks)
+        
+        embedding = None
+        if tasks is None and self._semantic_cache is not None:
+            embedding = await self.embedding_batcher.encode(message)
+            tasks = self._semantic_cache.lookup(user_id, embedding)
+        
+        if tasks is not None:
+            # Nouvelles instances : les tâches sont modifiées par la fusion et l'enrichissement
+            return [Task.from_dict(task) for task in tasks]
+        
+        tasks = await self._extract_by_ai(message, conversation_context)
+        
+        # Une liste vide peut venir d'une erreur : seules les extractions fructueuses sont mises en cache
+        if tasks:
+            cached = [task.to_dict() for task in tasks]
+            self._exact_cache_put(key, cached)
+            if embedding is not None:
+                self._semantic_cache.store(user_id, embedding, cached)
+            try:
+                await self._unacked_cache.update_one(
+                    {'_id': key},
+                    {'$set': {'user_id': user_id, 'tasks': cached, 'created_at': datetime.utcnow()}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Erreur écriture cache extraction: {e}")
+        
+        return tasks
+    
+    def _exact_cache_get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Extraction en cache mémoire pour cette clé (None si absente ou expirée)"""
+        entry = self._exact_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.cache_ttl_seconds:
+            del self._exact_cache[key]
+            return None
+        self._exact_cache.move_to_end(key)
+        return entry[1]
+    
+    def _exact_cache_put(self, key: str, tasks: List[Dict[str, Any]]):
+        """Ajoute une extraction au cache mémoire (éviction LRU)"""
+        self._exact_cache[key] = (time.monotonic(), tasks)
+        self._exact_cache.move_to_end(key)
+        while len(self._exact_cache) > self.cache_max_entries:
+            self._exact_cache.popitem(last=False)
+    
+    async def _persisted_cache_get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Extraction en cache MongoDB (partagée entre workers et redémarrages)"""
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.cache_ttl_seconds)
+            doc = await self.db.task_extraction_cache.find_one(
+                {'_id': key, 'created_at': {'$gte': cutoff}},
+                projection={'_id': 0, 'tasks': 1}
+            )
+            return doc['tasks'] if doc else None
+            
+        except Exception as e:
+            logger.warning(f"Erreur lecture cache extraction: {e}")
+            return None
+    
+    async def _extract_by_ai(self, message: str, conversation_context: List[Dict[str, Any]]) -> List[Task]:
         """Extraction via IA (GPT)"""
         try:
             # Construire le contexte de conversation
@@ -221,57 +494,62 @@ Réponds uniquement en JSON valide :
     ]
 }}"""
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=500
-            )
+            async with self._ai_semaphore:
+                response = await self.openai_client.chat.completions.create(
+                    model=self.ai_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=500,
+                    response_format=self._ai_response_format
+                )
+            
+            choice = response.choices[0]
+            if choice.finish_reason == 'length':
+                # Seule une réponse tronquée peut encore être du JSON invalide
+                logger.warning("Réponse IA tronquée (max_tokens atteint) : extraction ignorée")
+                return []
             
-            result = response.choices[0].message.content.strip()
+            parsed = _json_loads(choice.message.content)
+            # Ajouter metadata (tâches sans titre ignorées)
+            return [
+                Task.from_dict({**task, 'extraction_method': 'ai'})
+                for task in parsed.get('tasks', [])
+                if isinstance(task, dict) and task.get('title')
+            ]
             
-            # Parser la réponse JSON
-            try:
-                parsed = json.loads(result)
-                tasks = parsed.get('tasks', [])
-                
-                # Ajouter metadata
-                for task in tasks:
-                    task['extraction_method'] = 'ai'
-                
-                return tasks
-                
-            except json.JSONDecodeError:
-                logger.warning(f"Réponse IA non-JSON: {result}")
-                return []
-                
         except Exception as e:
             logger.error(f"Erreur extraction IA: {e}")
             return []
     
-    def _merge_task_extractions(self, rule_tasks: List[Dict[str, Any]], ai_tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _merge_task_extractions(self, rule_tasks: List[Task], ai_tasks: List[Task]) -> List[Task]:
         """Fusionne les résultats d'extraction par règles et IA"""
         try:
             merged = []
+            # Titres et mots des titres calculés une seule fois par tâche (alignés sur merged)
+            merged_titles = []
+            merged_tokens = []
             
             # Ajouter les tâches IA (généralement de meilleure qualité)
             for task in ai_tasks:
                 merged.append(task)
+                merged_titles.append(task.title)
+                merged_tokens.append(token_set(task.title))
             
             # Ajouter les tâches par règles si elles ne sont pas déjà présentes
             for rule_task in rule_tasks:
-                is_duplicate = False
-                for merged_task in merged:
-                    # Détection de doublons basique par similarité de titre
-                    if self._are_tasks_similar(rule_task['title'], merged_task['title']):
-                        is_duplicate = True
-                        # Enrichir avec les données des règles si nécessaire
-                        if not merged_task.get('estimated_date') and rule_task.get('estimated_date'):
-                            merged_task['estimated_date'] = rule_task['estimated_date']
-                        break
+                rule_tokens = token_set(rule_task.title)
+                # Détection de doublons par similarité de titre
+                duplicate_index = self._find_duplicate_title(rule_task.title, rule_tokens, merged_titles, merged_tokens)
                 
-                if not is_duplicate:
+                if duplicate_index is not None:
+                    # Enrichir avec les données des règles si nécessaire
+                    merged_task = merged[duplicate_index]
+                    if not merged_task.estimated_date and rule_task.estimated_date:
+                        merged_task.estimated_date = rule_task.estimated_date
+                else:
                     merged.append(rule_task)
+                    merged_titles.append(rule_task.title)
+                    merged_tokens.append(rule_tokens)
             
             return merged
             
@@ -279,52 +557,64 @@ Réponds uniquement en JSON valide :
             logger.error(f"Erreur fusion extractions: {e}")
             return rule_tasks + ai_tasks  # Fallback simple
     
-    def _are_tasks_similar(self, title1: str, title2: str) -> bool:
-        """Détecte si deux titres de tâches sont similaires"""
-        try:
-            # Normalisation simple
-            t1 = set(title1.lower().split())
-            t2 = set(title2.lower().split())
-            
-            # Intersection > 50% des mots
-            if len(t1) == 0 or len(t2) == 0:
-                return False
-            
-            intersection = len(t1.intersection(t2))
-            union = len(t1.union(t2))
-            
-            return (intersection / union) > 0.5
-            
-        except Exception as e:
-            logger.error(f"Erreur comparaison tâches: {e}")
-            return False
+    def _find_duplicate_title(self,
+                              title: str,
+                              tokens: frozenset,
+                              titles: List[str],
+                              titles_tokens: List[frozenset]) -> Optional[int]:
+        """Indice du titre similaire parmi titles (None s'il n'y en a pas)"""
+        if not titles:
+            return None
+        if process is not None:
+            # Meilleur score calculé en C++, coupure anticipée sous le seuil
+            match = process.extractOne(
+                title, titles,
+                scorer=fuzz.token_set_ratio,
+                processor=fuzz_utils.default_process,
+                score_cutoff=self.title_similarity_cutoff
+            )
+            return match[2] if match else None
+        # Repli : intersection > 50% des mots
+        return next((i for i, other in enumerate(titles_tokens) if jaccard(tokens, other) > 0.5), None)
     
-    async def _enrich_tasks_with_context(self, tasks: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+    async def _enrich_tasks_with_context(self,
+                                         tasks: List[Task],
+                                         user_id: str,
+                                         ctx: Optional[RequestCtx] = None) -> List[Task]:
         """Enrichit les tâches avec le contexte utilisateur"""
         try:
-            # Récupérer les objectifs utilisateur
-            user_goals = await self.db.goals.find(
-                {'user_id': user_id, 'status': 'active'}
-            ).to_list(length=10)
-            
-            # Récupérer le profil utilisateur
-            user_profile = await self.db.onboarding_profiles.find_one({'user_id': user_id})
+            # Objectifs et profils en un seul aller-retour (profils déjà lus si le contexte de requête est fourni)
+            user_goals, ctx = await self._load_enrichment_context(user_id, ctx)
+            user_profile = ctx.onboarding
             
             enriched_tasks = []
-            
-            for task in tasks:
+            # Colonnes alignées sur tasks, calculées une seule fois (textes, mots) puis traitées en lot
+            task_texts = [f"{task.title} {task.description}" for task in tasks]
+            # Objectif le plus proche de chaque tâche : embeddings, puis TF-IDF en repli
+            related_goals = await self._match_goals_by_embedding(task_texts, user_goals)
+            # TF-IDF seulement pour les tâches que les embeddings n'ont pas associées
+            unmatched = [i for i, goal in enumerate(related_goals) if goal is None]
+            if unmatched and user_goals:
+                lexical_goals = self._match_goals_by_tfidf(user_id, [task_texts[i] for i in unmatched], user_goals)
+                for i, goal_index in zip(unmatched, lexical_goals):
+                    if goal_index is not None:
+                        related_goals[i] = user_goals[goal_index]
+            # Catégorie selon le domaine utilisateur (identique pour toutes les tâches)
+            category = user_profile.get('domain', 'général') if user_profile else None
+            # Profil comportemental lu une seule fois pour toutes les tâches
+            behavior_profile = ctx.behavior
+            
+            for task, related_goal in zip(tasks, related_goals):
                 # Associer à un objectif si pertinent
-                related_goal = self._find_related_goal(task, user_goals)
                 if related_goal:
-                    task['related_goal_id'] = related_goal['id']
-                    task['related_goal_title'] = related_goal['title']
+                    task.related_goal_id = related_goal['id']
+                    task.related_goal_title = related_goal['title']
                 
-                # Catégoriser selon le domaine utilisateur
-                if user_profile:
-                    task['category'] = user_profile.get('domain', 'général')
+                if category is not None:
+                    task.category = category
                 
                 # Ajuster la priorité selon le profil comportemental
-                task = await self._adjust_priority_by_profile(task, user_id)
+                task = self._bump_priority(task, behavior_profile)
                 
                 enriched_tasks.append(task)
             
@@ -334,42 +624,204 @@ Réponds uniquement en JSON valide :
             logger.error(f"Erreur enrichissement tâches: {e}")
             return tasks
     
-    def _find_related_goal(self, task: Dict[str, Any], user_goals: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        """Trouve l'objectif le plus pertinent pour une tâche"""
+    async def _load_enrichment_context(self,
+                                       user_id: str,
+                                       ctx: Optional[RequestCtx] = None) -> Tuple[List[Dict[str, Any]], RequestCtx]:
+        """Objectifs actifs et contexte de requête (une seule agrégation $lookup si le contexte manque)"""
+        goals_filter = {'user_id': user_id, 'status': 'active'}
+        if ctx is None:
+            # Profils lus récemment (cache partagé du contexte de requête)
+            ctx = RequestCtx.cached(user_id)
+        if ctx is not None:
+            user_goals = await self.db.goals.find(goals_filter).to_list(length=10)
+            return user_goals, ctx
+        
+        by_user = {'$expr': {'$eq': ['$user_id', '$$uid']}}
+        pipeline = [
+            {'$match': {'id': user_id}},
+            {'$limit': 1},
+            {'$lookup': {
+                'from': 'goals',
+                'let': {'uid': '$id'},
+                'pipeline': [{'$match': by_user}, {'$match': {'status': 'active'}}, {'$limit': 10}],
+                'as': 'goals'
+            }},
+            {'$lookup': {
+                'from': 'onboarding_profiles',
+                'let': {'uid': '$id'},
+                'pipeline': [{'$match': by_user}, {'$limit': 1}],
+                'as': 'onboarding'
+            }},
+            {'$lookup': {
+                'from': 'user_behavior_profiles',
+                'let': {'uid': '$id'},
+                'pipeline': [{'$match': by_user}, {'$limit': 1}],
+                'as': 'behavior'
+            }}
+        ]
+        result = await self.db.users.aggregate(pipeline).to_list(length=1)
+        
+        if not result:
+            # Utilisateur introuvable : lectures séparées comme avant
+            user_goals = await self.db.goals.find(goals_filter).to_list(length=10)
+            ctx = await RequestCtx.load(self.db, user_id) or RequestCtx(user_id=user_id)
+            return user_goals, ctx
+        
+        user = result[0]
+        goals = user.pop('goals')
+        onboarding = user.pop('onboarding')
+        behavior = user.pop('behavior')
+        ctx = RequestCtx.remember(RequestCtx(
+            user_id=user_id,
+            user=user,
+            onboarding=onboarding[0] if onboarding else None,
+            behavior=behavior[0] if behavior else None
+        ))
+        return goals, ctx
+    
+    async def _match_goals_by_embedding(self,
+                                        task_texts: List[str],
+                                        user_goals: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Objectif sémantiquement le plus proche de chaque texte de tâche (None sous le seuil ou sans embeddings)"""
+        no_match = [None] * len(task_texts)
+        if self.embedding_batcher is None or not task_texts or not user_goals:
+            return no_match
+        
         try:
-            task_words = set(task['title'].lower().split())
-            task_desc_words = set(task.get('description', '').lower().split())
-            all_task_words = task_words.union(task_desc_words)
-            
-            best_match = None
-            best_score = 0
+            # Objectifs sans embedding ou modifiés depuis : calculés et enregistrés au passage
+            stale = [goal for goal in user_goals if goal.get('embedding_hash') != _text_hash(_goal_text(goal))]
+            if stale:
+                await asyncio.gather(*[self.update_goal_embedding(goal) for goal in stale])
+            
+            goal_matrix = normalize_rows(np.asarray([goal['embedding'] for goal in user_goals], dtype=np.float32))
+            # Embeddings des tâches regroupés par le batcher
+            task_matrix = np.stack(await asyncio.gather(*[
+                self.embedding_batcher.encode(text) for text in task_texts
+            ]))
+            
+            sims = task_matrix @ goal_matrix.T
+            best = sims.argmax(axis=1)
+            return [
+                user_goals[j] if sims[i, j] >= self.goal_similarity_threshold else None
+                for i, j in enumerate(best)
+            ]
             
-            for goal in user_goals:
-                goal_words = set(goal['title'].lower().split())
-                goal_desc_words = set(goal.get('description', '').lower().split())
-                all_goal_words = goal_words.union(goal_desc_words)
+        except Exception as e:
+            logger.warning(f"Erreur association sémantique objectifs: {e}")
+            return no_match
+    
+    async def update_goal_embedding(self, goal: Dict[str, Any]) -> Optional[List[float]]:
+        """Calcule et enregistre l'embedding normalisé d'un objectif (à appeler à la création et à la modification)"""
+        if self.embedding_batcher is None:
+            return None
+        
+        text = _goal_text(goal)
+        embedding = (await self.embedding_batcher.encode(text)).astype(np.float32).tolist()
+        goal['embedding'] = embedding
+        goal['embedding_hash'] = _text_hash(text)
+        try:
+            await self._unacked_goals.update_one(
+                {'id': goal['id']},
+                {'$set': {'embedding': embedding, 'embedding_hash': goal['embedding_hash']}}
+            )
+        except Exception as e:
+            logger.warning(f"Erreur enregistrement embedding objectif {goal.get('id')}: {e}")
+        return embedding
+    
+    async def backfill_goal_embeddings(self, batch_size: int = 100) -> int:
+        """Calcule les embeddings des objectifs actifs qui n'en ont pas encore (tâche de fond, par lots)"""
+        if self.embedding_batcher is None:
+            return 0
+        
+        try:
+            updated = 0
+            last_id = None
+            while True:
+                batch_filter = {'status': 'active', 'embedding': {'$exists': False}}
+                if last_id is not None:
+                    batch_filter['_id'] = {'$gt': last_id}
+                
+                batch = await self.db.goals.find(
+                    batch_filter, projection={'_id': 1, 'id': 1, 'title': 1, 'description': 1}
+                ).sort('_id', 1).limit(batch_size).to_list(length=batch_size)
+                if not batch:
+                    break
                 
-                # Calculer la similarité
-                intersection = len(all_task_words.intersection(all_goal_words))
-                union = len(all_task_words.union(all_goal_words))
+                last_id = batch[-1]['_id']
+                await asyncio.gather(*[self.update_goal_embedding(goal) for goal in batch])
+                updated += len(batch)
                 
-                if union > 0:
-                    score = intersection / union
-                    if score > best_score and score > 0.3:  # Seuil minimum
-                        best_score = score
-                        best_match = goal
+                if len(batch) < batch_size:
+                    break
             
-            return best_match
+            logger.info(f"Embeddings calculés pour {updated} objectifs")
+            return updated
             
         except Exception as e:
-            logger.error(f"Erreur association objectif: {e}")
-            return None
+            logger.error(f"Erreur calcul des embeddings d'objectifs: {e}")
+            return 0
+    
+    def _match_goals_by_tfidf(self,
+                              user_id: str,
+                              task_texts: List[str],
+                              user_goals: List[Dict[str, Any]],
+                              min_score: float = 0.3) -> List[Optional[int]]:
+        """Indice de l'objectif le plus proche (cosinus TF-IDF, produit de matrices creuses) pour chaque tâche"""
+        if not task_texts or not user_goals:
+            return [None] * len(task_texts)
+        
+        try:
+            vectorizer, goal_matrix = self._goal_vectorizer(user_id, user_goals)
+            # Lignes normalisées (L2) : le produit scalaire est la similarité cosinus
+            sims = (vectorizer.transform(task_texts) @ goal_matrix.T).toarray()
+            best = sims.argmax(axis=1)
+            return [int(j) if sims[i, j] > min_score else None for i, j in enumerate(best)]
+            
+        except Exception as e:
+            # Ex. vocabulaire vide : repli sur la similarité de Jaccard
+            logger.warning(f"Erreur association TF-IDF objectifs, repli Jaccard: {e}")
+            goal_tokens = [token_set(goal['title'], goal.get('description')) for goal in user_goals]
+            return self._find_related_goal_batch([token_set(text) for text in task_texts], goal_tokens)
+    
+    def _goal_vectorizer(self, user_id: str, user_goals: List[Dict[str, Any]]) -> Tuple[TfidfVectorizer, Any]:
+        """Vectoriseur TF-IDF ajusté sur les objectifs de l'utilisateur (réutilisé tant que ses objectifs ne changent pas)"""
+        goal_texts = [_goal_text(goal) for goal in user_goals]
+        signature = tuple((goal.get('id'), _text_hash(text)) for goal, text in zip(user_goals, goal_texts))
+        
+        entry = self._goal_vectorizers.get(user_id)
+        if entry is not None and entry[0] == signature:
+            self._goal_vectorizers.move_to_end(user_id)
+            return entry[1], entry[2]
+        
+        vectorizer = TfidfVectorizer()
+        goal_matrix = vectorizer.fit_transform(goal_texts)
+        self._goal_vectorizers[user_id] = (signature, vectorizer, goal_matrix)
+        self._goal_vectorizers.move_to_end(user_id)
+        while len(self._goal_vectorizers) > self.goal_vectorizers_max_users:
+            self._goal_vectorizers.popitem(last=False)
+        return vectorizer, goal_matrix
     
-    async def _adjust_priority_by_profile(self, task: Dict[str, Any], user_id: str) -> Dict[str, Any]:
-        """Ajuste la priorité selon le profil comportemental"""
+    def _find_related_goal_batch(self,
+                                 task_tokens: List[frozenset],
+                                 goal_tokens: List[frozenset],
+                                 min_score: float = 0.3) -> List[Optional[int]]:
+        """Indice de l'objectif le plus proche (Jaccard) pour chaque tâche, None sous le seuil minimum"""
         try:
-            behavior_profile = await self.db.user_behavior_profiles.find_one({'user_id': user_id})
+            if not task_tokens or not goal_tokens:
+                return [None] * len(task_tokens)
             
+            # Matrice tâches x objectifs puis meilleur objectif par ligne (le premier en cas d'égalité)
+            scores = np.array([[jaccard(task, goal) for goal in goal_tokens] for task in task_tokens], dtype=np.float32)
+            best = scores.argmax(axis=1)
+            return [int(j) if scores[i, j] > min_score else None for i, j in enumerate(best)]
+            
+        except Exception as e:
+            logger.error(f"Erreur association objectif: {e}")
+            return [None] * len(task_tokens)
+    
+    def _bump_priority(self, task: Task, behavior_profile: Optional[Dict[str, Any]]) -> Task:
+        """Ajuste la priorité selon le profil comportemental (déjà chargé, aucune requête)"""
+        try:
             if not behavior_profile:
                 return task
             
@@ -378,10 +830,10 @@ Réponds uniquement en JSON valide :
             
             if procrastination == 'high':
                 # Augmenter la priorité pour les procrastinateurs
-                if task['priority'] == 'basse':
-                    task['priority'] = 'moyenne'
-                elif task['priority'] == 'moyenne':
-                    task['priority'] = 'haute'
+                if task.priority == 'basse':
+                    task.priority = 'moyenne'
+                elif task.priority == 'moyenne':
+                    task.priority = 'haute'
             
             return task
             
@@ -402,8 +854,13 @@ Réponds uniquement en JSON valide :
             logger.error(f"Erreur calcul confiance: {e}")
             return 0.5
     
-    async def _log_extraction(self, user_id: str, conversation_id: str, message: str, tasks: List[Dict[str, Any]]):
-        """Log l'extraction pour analytics et amélioration"""
+    async def _log_extraction(self,
+                              user_id: str,
+                              conversation_id: str,
+                              message: str,
+                              tasks: List[Dict[str, Any]],
+                              now: Optional[datetime] = None):
+        """Log l'extraction pour analytics et amélioration (écriture par lots)"""
         try:
             log_entry = {
                 'user_id': user_id,
@@ -411,42 +868,110 @@ Réponds uniquement en JSON valide :
                 'original_message': message,
                 'tasks_extracted': len(tasks),
                 'extraction_confidence': self._calculate_confidence(tasks),
-                'timestamp': datetime.utcnow(),
-                'tasks_details': tasks
+                'timestamp': now or datetime.utcnow(),
+                # Copies : les tâches renvoyées à l'appelant peuvent changer avant l'écriture du lot
+                'tasks_details': [dict(task) for task in tasks]
             }
             
-            await self.db.task_extractions_log.insert_one(log_entry)
+            if len(self._log_buffer) >= self.log_buffer_max:
+                logger.warning("Buffer des logs d'extraction plein : log ignoré")
+                return
+            self._log_buffer.append(log_entry)
+            
+            # Vider le buffer en tâche de fond tous les log_flush_size logs ou toutes les log_flush_interval secondes
+            if (len(self._log_buffer) >= self.log_flush_size
+                    or time.monotonic() - self._last_log_flush >= self.log_flush_interval):
+                self._last_log_flush = time.monotonic()
+                task = asyncio.create_task(self.flush_extraction_logs())
+                self._bg_tasks.add(task)
+                task.add_done_callback(self._bg_tasks.discard)
             
         except Exception as e:
             logger.warning(f"Erreur log extraction: {e}")
     
+    async def flush_extraction_logs(self):
+        """Écrit en base les logs d'extraction en attente (à appeler aussi à l'arrêt)"""
+        async with self._log_lock:
+            if not self._log_buffer:
+                return
+            
+            batch, self._log_buffer = self._log_buffer, []
+            self._last_log_flush = time.monotonic()
+            
+            try:
+                await self.db.task_extractions_log.insert_many(batch, ordered=False)
+            except Exception as e:
+                logger.warning(f"Erreur écriture logs extraction ({len(batch)} perdus): {e}")
+                return
+            
+            # Agrégat journalier (jour, utilisateur) pour les analytics
+            try:
+                daily = defaultdict(lambda: [0, 0, 0.0])
+                for log in batch:
+                    totals = daily[(log['timestamp'].replace(hour=0, minute=0, second=0, microsecond=0), log['user_id'])]
+                    totals[0] += 1
+                    totals[1] += log['tasks_extracted']
+                    totals[2] += log['extraction_confidence']
+                await self.db.task_extractions_daily.bulk_write([
+                    UpdateOne(
+                        {'date': date, 'user_id': user_id},
+                        {'$inc': {'count': count, 'tasks_found': tasks_found, 'sum_conf': sum_conf}},
+                        upsert=True
+                    )
+                    for (date, user_id), (count, tasks_found, sum_conf) in daily.items()
+                ], ordered=False)
+            except Exception as e:
+                logger.warning(f"Erreur agrégat journalier extractions: {e}")
+    
     async def get_extraction_analytics(self, user_id: Optional[str] = None, days: int = 30) -> Dict[str, Any]:
         """Récupère les analytics d'extraction de tâches"""
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
+            cutoff_date = (datetime.utcnow() - timedelta(days=days)).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
             
-            match_filter = {'timestamp': {'$gte': cutoff_date}}
+            match_filter = {'date': {'$gte': cutoff_date}}
             if user_id:
                 match_filter['user_id'] = user_id
             
+            # Lecture de l'agrégat journalier (au plus `days` lignes par utilisateur) plutôt que des logs bruts
             pipeline = [
                 {'$match': match_filter},
+                # Seuls les compteurs sont lus au-delà du filtre
+                {'$project': {'_id': 0, 'user_id': 1, 'count': 1, 'tasks_found': 1, 'sum_conf': 1}},
+                {'$group': {
+                    '_id': '$user_id',
+                    'count': {'$sum': '$count'},
+                    'tasks_found': {'$sum': '$tasks_found'},
+                    'sum_conf': {'$sum': '$sum_conf'}
+                }},
                 {'$group': {
                     '_id': None,
-                    'total_extractions': {'$sum': 1},
-                    'total_tasks_found': {'$sum': '$tasks_extracted'},
-                    'avg_confidence': {'$avg': '$extraction_confidence'},
-                    'unique_users': {'$addToSet': '$user_id'}
+                    'total_extractions': {'$sum': '$count'},
+                    'total_tasks_found': {'$sum': '$tasks_found'},
+                    'sum_conf': {'$sum': '$sum_conf'},
+                    'unique_users_count': {'$sum': 1}
+                }},
+                {'$project': {
+                    '_id': 0,
+                    'total_extractions': 1,
+                    'total_tasks_found': 1,
+                    'avg_confidence': {'$cond': [
+                        {'$gt': ['$total_extractions', 0]},
+                        {'$divide': ['$sum_conf', '$total_extractions']},
+                        0.0
+                    ]},
+                    'unique_users_count': 1
                 }}
             ]
             
-            result = await self.db.task_extractions_log.aggregate(pipeline).to_list(length=1)
+            # Coût borné : la requête est abandonnée au-delà de analytics_max_time_ms
+            result = await self.db.task_extractions_daily.aggregate(
+                pipeline, maxTimeMS=self.analytics_max_time_ms
+            ).to_list(length=1)
             
             if result:
-                stats = result[0]
-                stats['unique_users_count'] = len(stats['unique_users'])
-                del stats['unique_users']
-                return stats
+                return result[0]
             
             return {
                 'total_extractions': 0,
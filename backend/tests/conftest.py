@@ -0,0 +1,8 @@
+"""
+🧪 Configuration des tests des services
+Rend le paquet `services` importable depuis le dossier backend
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
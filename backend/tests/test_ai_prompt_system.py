@@ -0,0 +1,35 @@
+"""
+🧪 Tests de la sérialisation de l'historique conversationnel
+"""
+from services.ai_prompt_system import AIPromptSystem
+
+format_history = AIPromptSystem.format_conversation_history
+
+
+def _memory(user_message: str, ai_response: str) -> dict:
+    return {'user_message': user_message, 'ai_response': ai_response}
+
+
+def test_exchanges_within_budget_are_kept_in_order():
+    history = format_history([_memory('a', 'b'), _memory('c', 'd')])
+    assert history == "Utilisateur: a\nAssistant: b\nUtilisateur: c\nAssistant: d"
+
+
+def test_oversized_first_exchange_is_truncated_not_dropped():
+    history = format_history([_memory('question', 'x' * 5000), _memory('c', 'd')], max_chars=2000)
+    assert history.startswith("Utilisateur: question\nAssistant: xxx")
+    assert history.endswith("…")
+    assert len(history) <= 2000
+    assert "Utilisateur: c" not in history
+
+
+def test_exchange_over_remaining_budget_is_truncated_last():
+    history = format_history([_memory('a', 'b'), _memory('c', 'y' * 5000), _memory('e', 'f')], max_chars=100)
+    assert history.startswith("Utilisateur: a\nAssistant: b\nUtilisateur: c\nAssistant: yyy")
+    assert history.endswith("…")
+    assert "Utilisateur: e" not in history
+    assert len(history) <= 100
+
+
+def test_empty_history():
+    assert format_history([]) == ''
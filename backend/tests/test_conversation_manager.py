@@ -0,0 +1,72 @@
+"""
+🧪 Tests du nettoyage des conversations inactives
+"""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from services.conversation_manager import ConversationManager
+
+
+class _FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, limit):
+        self._docs = self._docs[:limit]
+        return self
+
+    async def to_list(self, length=None):
+        return self._docs
+
+
+class _FakeConversations:
+    """Collection factice : enregistre les filtres reçus"""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.find_filters = []
+        self.update_filters = []
+
+    def find(self, query, projection=None):
+        self.find_filters.append(query)
+        last_id = query.get('_id', {}).get('$gt', -1)
+        return _FakeCursor([{'_id': _id} for _id in self.ids if _id > last_id])
+
+    async def update_many(self, query, update):
+        self.update_filters.append(query)
+        return SimpleNamespace(modified_count=len(query['_id']['$in']))
+
+
+def _run_cleanup(ids, **kwargs):
+    conversations = _FakeConversations(ids)
+    manager = ConversationManager(SimpleNamespace(conversations=conversations))
+    modified = asyncio.run(manager.cleanup_inactive_conversations(**kwargs))
+    return conversations, modified
+
+
+def test_cleanup_targets_only_old_empty_conversations():
+    conversations, modified = _run_cleanup([1, 2], days_threshold=30)
+    
+    query = conversations.find_filters[0]
+    assert query['is_active'] is True
+    assert query['message_count'] == 0
+    cutoff = query['created_at']['$lt']
+    assert abs(cutoff - (datetime.utcnow() - timedelta(days=30))) < timedelta(minutes=1)
+    # Aucune condition sur le dernier message (None pour une conversation vide)
+    assert 'last_message_at' not in query and '$or' not in query
+    assert modified == 2
+
+
+def test_cleanup_update_repeats_the_filter():
+    conversations, _ = _run_cleanup([1, 2, 3], batch_size=2)
+    
+    assert len(conversations.update_filters) == 2
+    for query in conversations.update_filters:
+        assert query['is_active'] is True
+        assert query['message_count'] == 0
+        assert '$lt' in query['created_at']
+    assert [query['_id']['$in'] for query in conversations.update_filters] == [[1, 2], [3]]
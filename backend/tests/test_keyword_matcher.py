@@ -0,0 +1,53 @@
+"""
+🧪 Tests de KeywordMatcher (automate Aho–Corasick et repli par sous-chaînes)
+"""
+import pytest
+
+from services import keyword_matcher
+from services.keyword_matcher import KeywordMatcher
+
+
+@pytest.fixture(params=['automaton', 'fallback'])
+def make_matcher(request, monkeypatch):
+    """Construit un matcher avec l'automate (si pyahocorasick est installé) ou le repli"""
+    if request.param == 'automaton' and keyword_matcher.ahocorasick is None:
+        pytest.skip("pyahocorasick non installé")
+    if request.param == 'fallback':
+        monkeypatch.setattr(keyword_matcher, 'ahocorasick', None)
+    return KeywordMatcher
+
+
+def test_substring_mode_matches_inside_words(make_matcher):
+    matcher = make_matcher({'verb': ['lire']})
+    assert matcher.scan("Il faut relire le contrat") == {'verb': {'lire'}}
+
+
+def test_whole_words_ignores_matches_inside_words(make_matcher):
+    matcher = make_matcher({'verb': ['lire', 'écrire']}, whole_words=True)
+    assert matcher.scan("Il faut relire et réécrire le contrat") == {}
+    assert matcher.scan("Lire, puis écrire.") == {'verb': {'lire', 'écrire'}}
+
+
+def test_whole_words_accepts_multi_word_keywords(make_matcher):
+    matcher = make_matcher({'relative': ['la semaine prochaine']}, whole_words=True)
+    assert matcher.scan("à finir la semaine prochaine") == {'relative': {'la semaine prochaine'}}
+    assert matcher.scan("la semaine prochaines") == {}
+
+
+def test_keyword_shared_by_several_categories(make_matcher):
+    matcher = make_matcher({'a': ['motivé'], 'b': ['motivé', 'prêt']}, whole_words=True)
+    assert matcher.scan("je suis motivé") == {'a': {'motivé'}, 'b': {'motivé'}}
+
+
+def test_matches_are_sorted_by_position(make_matcher):
+    matcher = make_matcher({'day': ['lundi', 'mardi'], 'verb': ['appeler']}, whole_words=True)
+    hits = matcher.matches("Appeler Marc mardi ou lundi")
+    assert [(start, keyword) for start, keyword, _ in hits] == [(0, 'appeler'), (13, 'mardi'), (22, 'lundi')]
+    assert hits[0][2] == frozenset(['verb'])
+
+
+def test_scan_split_separates_prefix_matches(make_matcher):
+    matcher = make_matcher({'goal': ['objectif', 'projet']})
+    found, found_in_prefix = matcher.scan_split("objectif atteint, nouveau projet", 10)
+    assert found == {'goal': {'objectif', 'projet'}}
+    assert found_in_prefix == {'goal': {'objectif'}}
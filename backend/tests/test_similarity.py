@@ -0,0 +1,46 @@
+"""
+🧪 Tests des noyaux de similarité vectorielle et lexicale
+"""
+import numpy as np
+import pytest
+
+from services.similarity import normalize_rows, topk_cosine, token_set, jaccard
+
+
+def test_normalize_rows_keeps_zero_rows():
+    matrix = normalize_rows(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    assert matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix, [[0.6, 0.8], [0.0, 0.0]], rtol=1e-6)
+
+
+def test_topk_cosine_returns_best_rows_in_order():
+    matrix = normalize_rows(np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0], [-1.0, 0.0]]))
+    query = normalize_rows(np.array([[1.0, 0.2]]))[0]
+    top, scores = topk_cosine(matrix, query, 2)
+    assert list(top) == [0, 2]
+    assert scores[0] >= scores[1]
+    np.testing.assert_allclose(scores, matrix[top] @ query, rtol=1e-6)
+
+
+def test_topk_cosine_caps_k_to_row_count():
+    matrix = normalize_rows(np.eye(3))
+    top, scores = topk_cosine(matrix, matrix[1], 10)
+    assert len(top) == 3
+    assert top[0] == 1
+    assert scores[0] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize('matrix, k', [(np.empty((0, 3), dtype=np.float32), 5), (np.eye(3, dtype=np.float32), 0)])
+def test_topk_cosine_empty_results(matrix, k):
+    top, scores = topk_cosine(matrix, np.ones(3, dtype=np.float32), k)
+    assert top.size == 0 and scores.size == 0
+
+
+def test_token_set_lowercases_and_skips_missing_texts():
+    assert token_set("Lire le Livre", None, "") == frozenset(['lire', 'le', 'livre'])
+
+
+def test_jaccard():
+    assert jaccard(frozenset('ab'), frozenset('bc')) == pytest.approx(1 / 3)
+    assert jaccard(frozenset('ab'), frozenset('ab')) == 1.0
+    assert jaccard(frozenset(), frozenset('ab')) == 0.0
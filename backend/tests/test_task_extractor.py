@@ -0,0 +1,80 @@
+"""
+🧪 Tests de l'extraction de tâches par règles et des échéances
+"""
+from datetime import datetime
+
+import pytest
+
+from services.task_extractor import TaskExtractor, parse_deadline
+
+# Jeudi 15 octobre 2026
+TODAY = datetime(2026, 10, 15, 9, 30)
+
+
+class _FakeDB:
+    """Base factice : aucune requête n'est émise par l'extraction par règles"""
+
+    def __getattr__(self, name):
+        return self
+
+    def with_options(self, **kwargs):
+        return self
+
+
+@pytest.fixture
+def extractor():
+    return TaskExtractor(_FakeDB(), openai_client=None)
+
+
+@pytest.mark.parametrize('message, expected', [
+    ("Je dois appeler Marc aujourd'hui", '2026-10-15'),
+    ("Je dois appeler Marc demain", '2026-10-16'),
+    ("Je dois appeler Marc lundi", '2026-10-19'),
+    ("Je dois appeler Marc vendredi", '2026-10-16'),
+    # Même jour de la semaine : la semaine suivante, jamais aujourd'hui
+    ("Je dois appeler Marc jeudi", '2026-10-22'),
+    # Échéance relative prioritaire sur le jour de la semaine
+    ("Je dois appeler Marc demain ou lundi", '2026-10-16'),
+    ("Je dois appeler Marc la semaine prochaine", '2026-10-22'),
+    ("Je dois appeler Marc", None),
+])
+def test_rule_deadlines(extractor, message, expected):
+    tasks = list(extractor._extract_by_rules(message, today=TODAY))
+    assert len(tasks) == 1
+    assert tasks[0].estimated_date == expected
+    # Verbe et échéance explicites : confiance suffisante pour se passer de l'IA
+    assert tasks[0].confidence == (0.8 if expected else 0.7)
+
+
+def test_rules_split_sentences_and_skip_sentences_without_verb(extractor):
+    tasks = list(extractor._extract_by_rules(
+        "Il fait beau. Je vais lire le rapport lundi! Je dois envoyer le mail demain", today=TODAY
+    ))
+    assert [(task.title, task.estimated_date) for task in tasks] == [
+        ('Le rapport lundi', '2026-10-19'),
+        ('Le mail demain', '2026-10-16'),
+    ]
+
+
+def test_rules_match_whole_words_only(extractor):
+    # « relire » contient « lire », « lundis » contient « lundi »
+    assert list(extractor._extract_by_rules("Il faudra relire tout ça", today=TODAY)) == []
+    tasks = list(extractor._extract_by_rules("Je vais lire le journal des lundis", today=TODAY))
+    assert tasks[0].estimated_date is None
+
+
+def test_rule_priority(extractor):
+    tasks = list(extractor._extract_by_rules("Terminer le dossier urgent demain", today=TODAY))
+    assert tasks[0].priority == 'haute'
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2026-10-19', datetime(2026, 10, 19)),
+    (None, None),
+    ('', None),
+    ('demain', None),
+    ('2026-13-01', None),
+    (20261019, None),
+])
+def test_parse_deadline(value, expected):
+    assert parse_deadline(value) == expected